@@ -0,0 +1,216 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from constants import Constants
+from filehandler import FileHandler
+from fleet_assignment import FleetAssignment
+from package import PackageColumns
+from population_matrix import PopulationMatrix
+from shipping_company import ShippingCompany
+
+try:
+    import resource
+except ImportError: # not available on windows
+    resource = None
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+DATA_DIRPATH = "benchmark_data"
+RESULTS_DIRPATH = "benchmark_results"
+
+def generate_synthetic_inventory(filepath: str, amt_packages: int, seed: int = 0):
+    # same schema and value ranges as lagerstatus.csv: 0.1-12 kg in 0.1 kg steps, price categories 1-9 with 3-6 more
+    # common, deadlines -5 to 9 with about a tenth of the packages already late
+    rng = np.random.default_rng(seed)
+    ids = 2241323127 + np.cumsum(rng.integers(1, 7, size=amt_packages))
+    weights = rng.integers(1, 121, size=amt_packages) / 10
+    price_category_odds = np.array([2, 2, 3, 3, 3, 3, 2, 2, 2]) / 22
+    price_categories = rng.choice(np.arange(1, 10), size=amt_packages, p=price_category_odds)
+    deadline_odds = np.array([2] * 5 + [9] * 10) / 100
+    deadlines = rng.choice(np.arange(-5, 10), size=amt_packages, p=deadline_odds)
+
+    with open(f"{filepath}.tmp", "w", encoding='utf-8') as file:
+        file.write("Paket_id,Vikt,Förtjänst,Deadline\n")
+        for start in range(0, amt_packages, 100_000):
+            rows = slice(start, start + 100_000)
+            file.writelines(f"{id},{weight:.1f},{price_category},{deadline}\n"
+                            for id, weight, price_category, deadline in zip(ids[rows].tolist(), weights[rows].tolist(),
+                                                                          price_categories[rows].tolist(), deadlines[rows].tolist()))
+    os.replace(f"{filepath}.tmp", filepath)
+
+def synthetic_inventory_filepath(amt_packages: int, seed: int) -> str:
+    filepath = os.path.join(DATA_DIRPATH, f"lagerstatus_{amt_packages}_{seed}.csv")
+    if not os.path.exists(filepath):
+        os.makedirs(DATA_DIRPATH, exist_ok=True)
+        generate_synthetic_inventory(filepath, amt_packages, seed)
+    return filepath
+
+def git_commit() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, check=True).stdout.strip() != ""
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10 # bytes on macOS, kB elsewhere
+
+def copy_packages(packages: PackageColumns) -> PackageColumns:
+    return packages.take(np.arange(len(packages)))
+
+def measure(results: dict, stage: str, function, trace_memory: bool = False, repeat: int = 1):
+    # runs function repeat times with its console output suppressed and stores the mean seconds per call
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            value = function()
+    seconds = (time.perf_counter() - start) / repeat
+
+    results[stage] = {"seconds": seconds}
+    if trace_memory:
+        results[stage]["peak_traced_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    print(f"  {stage}: {seconds * 1000:.3f} ms")
+    return value
+
+def time_to_target(generation_history: list[tuple[float, float]], start: float, target_fitness: float) -> float | None:
+    for timestamp, best_fitness in generation_history:
+        if best_fitness >= target_fitness:
+            return timestamp - start
+    return None
+
+def benchmark_inventory(filepath: str, engine: str, args) -> dict:
+    stages = {}
+    filehandler = FileHandler()
+    measure(stages, "load_csv", lambda: filehandler.create_package_columns_from_file(filepath, use_cache=False), args.trace_memory)
+    filehandler.create_package_columns_from_file(filepath) # make sure the cache exists
+    packages = measure(stages, "load_cache", lambda: filehandler.create_package_columns_from_file(filepath), args.trace_memory)
+    packages = copy_packages(packages)
+
+    def stream_ingest():
+        # the whole inventory arrives in batches into a live company whose package fitness is already in use
+        shipping_company = ShippingCompany(packages.take(np.arange(1)), engine=engine)
+        shipping_company.package_fitness
+        for batch in filehandler.stream_package_columns(filepath):
+            shipping_company.add_packages(batch)
+        return shipping_company
+    measure(stages, "stream_ingest", stream_ingest, args.trace_memory)
+    stages["stream_ingest"]["packages_per_second"] = len(packages) / stages["stream_ingest"]["seconds"]
+
+    shipping_company = ShippingCompany(copy_packages(packages), engine=engine)
+    solution = shipping_company.generate_random_solutions(1)[0]
+    measure(stages, "solution_recalculate", solution.recalculate, args.trace_memory, repeat=args.repeat)
+
+    if engine == "solution":
+        population = shipping_company.generate_random_solutions()
+        measure(stages, "next_generation", lambda: shipping_company.generate_next_generation(population, 0), args.trace_memory)
+    elif engine == "fleet":
+        capacities = np.full(Constants.AMT_TRUCKS.value, Constants.WEIGHT_LIMIT.value, dtype=np.float64)
+        population = FleetAssignment.generate_random(packages.weights, shipping_company.package_fitness, capacities, shipping_company.parameters.population_size, np.random.default_rng(args.seed))
+        measure(stages, "next_generation", lambda: population.generate_next_generation(0, np.random.default_rng(args.seed)), args.trace_memory)
+    else:
+        population = PopulationMatrix(packages.weights, packages.price_categories, shipping_company.package_fitness, shipping_company.generate_initial_genomes(),
+                                      shipping_company.repair_children, parameters=shipping_company.parameters)
+        measure(stages, "next_generation", lambda: population.generate_next_generation(0, np.random.default_rng(args.seed)), args.trace_memory)
+
+    if engine != "fleet": # the fleet engine only plans whole fleets
+        shipping_company = ShippingCompany(copy_packages(packages), engine=engine)
+        start = time.perf_counter()
+        best_solution = measure(stages, "genetic_algorithm", shipping_company.genetic_algorithm, args.trace_memory)
+        history = shipping_company.generation_history
+        amt_generations = len(history) - 1
+        target_fitness = args.target_fitness if args.target_fitness is not None else args.target_ratio * best_solution.fitness
+        stages["genetic_algorithm"].update({
+            "generations": amt_generations,
+            "generations_per_second": amt_generations / stages["genetic_algorithm"]["seconds"],
+            "best_fitness": best_solution.fitness,
+            "target_fitness": target_fitness,
+            "time_to_target_seconds": time_to_target(history, start, target_fitness),
+        })
+
+    for time_budget in [None, *args.time_budgets]:
+        stage = "load_fleet" if time_budget is None else f"load_fleet_budget_{time_budget:g}s"
+        shipping_company = ShippingCompany(copy_packages(packages), engine=engine, time_budget=time_budget)
+        measure(stages, stage, shipping_company.load_fleet, args.trace_memory)
+        stages[stage].update({
+            "time_budget": time_budget,
+            "packages_loaded": sum(len(truck.packages) for truck in shipping_company.fleet),
+            "profit": shipping_company.calculate_profit_fleet(),
+            "fitness": sum(plan["fitness"] for plan in shipping_company.planning_reports),
+            "generations": sum(plan["generations"] or 0 for plan in shipping_company.planning_reports),
+            "stopped_by_budget": sum(plan["stopped"] == "time_budget" for plan in shipping_company.planning_reports),
+        })
+
+    return stages
+
+def benchmark_in_fresh_process(filepath: str, engine: str, args) -> dict:
+    # ru_maxrss is the peak of the whole process, so every size and engine runs in a process of its own and reports
+    # its own peak instead of the largest one so far
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(run_benchmark, filepath, engine, args).result()
+
+def run_benchmark(filepath: str, engine: str, args) -> dict:
+    stages = benchmark_inventory(filepath, engine, args)
+    return {"stages": stages, "peak_rss_mb": peak_rss_mb()}
+
+def parse_args(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Time loading and planning on synthetic inventories and write the results as JSON.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="inventory sizes in packages")
+    parser.add_argument("--engines", nargs="+", default=["matrix"], choices=("solution", "matrix", "island", "fleet"))
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic inventories")
+    parser.add_argument("--repeat", type=int, default=100, help="calls averaged for the per-call stages")
+    parser.add_argument("--target-ratio", type=float, default=0.99, help="time to target is measured to this share of the final best fitness")
+    parser.add_argument("--target-fitness", type=float, default=None, help="absolute target fitness, overrides --target-ratio")
+    parser.add_argument("--time-budgets", type=float, nargs="*", default=[], help="also plan the fleet under each of these budgets in seconds to compare fitness against budget")
+    parser.add_argument("--trace-memory", action="store_true", help="record the traced peak memory of every stage, slows the stages down")
+    parser.add_argument("--output", default=None, help=f"result file, defaults to {RESULTS_DIRPATH}/<commit>.json")
+    return parser.parse_args(argv)
+
+def main(argv: list[str] = None):
+    args = parse_args(argv)
+    report = {
+        **git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "population_size": Constants.POPULATION_SIZE.value,
+        "seed": args.seed,
+        "results": [],
+    }
+
+    for amt_packages in args.sizes:
+        filepath = synthetic_inventory_filepath(amt_packages, args.seed)
+        for engine in args.engines:
+            print(f"{amt_packages} packages, {engine} engine")
+            report["results"].append({"packages": amt_packages, "engine": engine, **benchmark_in_fresh_process(filepath, engine, args)})
+
+    output_filepath = args.output
+    if output_filepath is None:
+        commit = (report["commit"] or "unknown")[:12] + ("-dirty" if report["dirty"] else "")
+        output_filepath = os.path.join(RESULTS_DIRPATH, f"{commit}.json")
+    os.makedirs(os.path.dirname(output_filepath) or ".", exist_ok=True)
+    with open(output_filepath, "w", encoding='utf-8') as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f"Results written to {output_filepath}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import json
+import os
+
+import numpy as np
+
+class Checkpoint:
+    # Population and search state of a GA run. Boolean genomes are stored bit-packed, the rest of the state as json metadata.
+    VERSION = 1
+
+    def __init__(self, genomes: np.ndarray, package_ids: np.ndarray, generation: int, counter_avg_seen: int, best_fitness: float, rng_state: dict,
+                 finished: bool = False):
+        self.genomes = genomes
+        self.package_ids = package_ids
+        self.generation = generation
+        self.counter_avg_seen = counter_avg_seen
+        self.best_fitness = best_fitness
+        self.rng_state = rng_state
+        self.finished = finished
+
+    def matches(self, package_ids: np.ndarray) -> bool:
+        # a run can only be continued exactly on the inventory it was checkpointed on
+        return np.array_equal(self.package_ids, package_ids)
+
+    def save(self, filepath: str):
+        packed = self.genomes.dtype == bool
+        meta = {
+            "version": self.VERSION,
+            "generation": self.generation,
+            "counter_avg_seen": self.counter_avg_seen,
+            "best_fitness": self.best_fitness,
+            "rng_state": self.rng_state,
+            "finished": self.finished,
+            "shape": list(self.genomes.shape),
+            "packed": packed,
+        }
+        genomes = np.packbits(self.genomes, axis=1) if packed else self.genomes
+
+        os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+        with open(f"{filepath}.tmp", "wb") as checkpoint_file:
+            np.savez_compressed(checkpoint_file, genomes=genomes, package_ids=self.package_ids, meta=np.array(json.dumps(meta)))
+        os.replace(f"{filepath}.tmp", filepath)
+
+    @classmethod
+    def load(cls, filepath: str) -> "Checkpoint":
+        with np.load(filepath) as checkpoint_file:
+            meta = json.loads(str(checkpoint_file["meta"]))
+            if meta.get("version") != cls.VERSION:
+                raise ValueError(f"Checkpoint {filepath} has version {meta.get('version')}, expected {cls.VERSION}")
+
+            genomes = checkpoint_file["genomes"]
+            if meta["packed"]:
+                genomes = np.unpackbits(genomes, axis=1, count=meta["shape"][1]).astype(bool)
+            package_ids = checkpoint_file["package_ids"]
+
+        return cls(genomes, package_ids, meta["generation"], meta["counter_avg_seen"], meta["best_fitness"], meta["rng_state"], meta["finished"])
@@ -9,6 +9,7 @@ class Constants(Enum):
     MAX_GENERATIONS = 500
     AMT_TOURNAMENT_PARTICIPANTS = 8 # should be even number less than population size
     CROSSOVER_RATE = 0.8
+    CROSSOVER_OPERATOR = "single_point" # single_point, two_point or uniform
     MUTATION_RATE = 0.001
     MAX_MUTATION_RATE = 0.1
     FITNESS_DELTA_THRESHOLD = 0.1
@@ -22,4 +23,32 @@ class Constants(Enum):
     WEIGHT_WEIGHT = 3 # 1 worked well too
 
     ELITISM_PARTICIPANTS = 5
+    # greedy makes every child fit the weight limit and fills spare capacity greedily, none leaves children as they are.
+    # Not a bool: True equals 1, so the enum would make it an alias of PRICE_CAT_WEIGHT
+    CHILD_REPAIR = "greedy"
+    FITNESS_CACHE_SIZE = 10000 # evaluated genomes remembered per run, 0 disables the cache
+
+    # island model
+    AMT_ISLANDS = 4
+    MIGRATION_INTERVAL = 10
+    AMT_MIGRANTS = 2
+
+    # checkpoints
+    CHECKPOINT_INTERVAL = 10 # generations between checkpoints when a checkpoint directory is given
+
+    # streaming ingestion
+    STREAM_BATCH_SIZE = 4096 # packages per batch read from a streamed csv
+    STREAM_POLL_INTERVAL = 0.05 # seconds between checks for rows appended to a followed csv
+
+    # stock status write-back
+    STOCK_LOG_COMPACT_RATIO = 0.5 # the change log is folded into the csv once it grows past this share of the csv's size
+
+    # knapsack engines
+    KNAPSACK_RESOLUTION = 10 # weights are given in 0.1 kg
+    KNAPSACK_MAX_ITEMS = 20000
+
+    # initial population
+    GREEDY_SEED_RATIO = 0.1 # share of the population started from greedy loads
+    GREEDY_SEED_NOISE = 0.2
+
     LAGERSTATUS_FILEPATH = "lagerstatus.csv"
\ No newline at end of file
@@ -1,6 +1,6 @@
 from collections import Counter
 
-from package import Package
+from package import Package, PackageColumns
 from constants import Constants
 
 class DeliveryTruck:
@@ -8,19 +8,24 @@ class DeliveryTruck:
         self.id = id
         self.max_weight = Constants.WEIGHT_LIMIT.value
         self.weight = 0
-        self.packages = []
+        self.packages = self.empty_packages()
+
+    @staticmethod
+    def empty_packages() -> PackageColumns:
+        # the load is kept as columns, so the totals and counts below come from the running aggregates of PackageColumns
+        return PackageColumns([], [], [], [])
 
     def total_price(self):
-        return sum([package.price_category for package in self.packages])
+        return self.packages.total_price_category
 
     def total_late_fees(self):
-        return sum([package.late_fee for package in self.packages])
+        return self.packages.total_late_fees
 
     def price_category_counts(self):
-        return Counter([package.price_category for package in self.packages])
+        return PackageColumns.count_values(self.packages.price_categories)
 
     def deadlines_counts(self):
-        return Counter([package.deadline for package in self.packages])
+        return Counter(self.packages.deadline_counts)
 
     def load_package(self, package: Package):
         truck_weight = round(self.weight, 2)
@@ -29,11 +34,32 @@ class DeliveryTruck:
             raise ValueError("Loading package weight would exceed maximum weight")
 
         self.weight = truck_weight + package.weight
-        self.packages.append(package)
+        self.packages.extend([package])
+
+    def load_packages(self, packages: PackageColumns):
+        truck_weight = round(self.weight, 2)
+        packages_weight = round(float(packages.weights.sum()), 2)
+        if truck_weight + packages_weight > self.max_weight:
+            print(f"truck current weight: {self.weight}, packages weight: {packages_weight}")
+            raise ValueError("Loading packages weight would exceed maximum weight")
+
+        self.weight = truck_weight + packages_weight
+        self.packages.extend(packages)
 
     def empty_load(self):
         self.weight = 0
-        self.packages = []
+        self.packages = self.empty_packages()
+
+    def report(self) -> dict:
+        return {
+            "id": self.id,
+            "weight": round(self.weight, 2),
+            "packages": len(self.packages),
+            "profit": int(self.total_price()),
+            "late_fees": int(self.total_late_fees()),
+            "price_category_counts": {int(price_category): amount for price_category, amount in sorted(self.price_category_counts().items())},
+            "deadline_counts": {int(deadline): amount for deadline, amount in sorted(self.deadlines_counts().items())},
+        }
 
-    def print_report(self):
-        print(f"Truck {self.id}: {self.weight} kg, {self.total_price()} profit, {self.total_late_fees()} late fees, \nDistribution of price score: {self.price_category_counts()}\nDistribution of deadlines: {self.deadlines_counts()}\n")
\ No newline at end of file
+    def print_report(self, file=None):
+        print(f"Truck {self.id}: {self.weight} kg, {self.total_price()} profit, {self.total_late_fees()} late fees, \nDistribution of price score: {self.price_category_counts()}\nDistribution of deadlines: {self.deadlines_counts()}\n", file=file)
\ No newline at end of file
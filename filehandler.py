@@ -1,10 +1,28 @@
-from package import Package
+from package import Package, PackageColumns
 import csv
+import hashlib
+import json
+import os
+import sys
+import time
+import numpy as np
 from constants import Constants
 
 class FileHandler:
+    COLUMNS = {
+        "Paket_id": ("id", np.int64),
+        "Vikt": ("weight", np.float64),
+        "Förtjänst": ("price_category", np.int8),
+        "Deadline": ("deadline", np.int16),
+    }
+    COLUMN_ATTRIBUTES = {"id": "ids", "weight": "weights", "price_category": "price_categories", "deadline": "deadlines"}
+
+    CACHE_VERSION = 1
+
     def __init__(self):
         self.lagerstatus_filepath = Constants.LAGERSTATUS_FILEPATH.value
+        self.last_load_source = None
+        self.last_load_seconds = None
 
     def create_packages_from_file(self, filepath: str = None) -> list[Package]:
         with open(filepath or self.lagerstatus_filepath, "r", encoding='utf-8') as lagerstatus_file:
@@ -22,4 +40,269 @@ class FileHandler:
 
                 packages_list.append(package)
 
-            return packages_list
\ No newline at end of file
+            return packages_list
+
+    def create_package_columns_from_file(self, filepath: str = None, use_cache: bool = True) -> PackageColumns:
+        filepath = filepath or self.lagerstatus_filepath
+        start = time.perf_counter()
+
+        package_columns = self.read_package_columns_cache(filepath) if use_cache else None
+        self.last_load_source = "cache"
+
+        if package_columns is None:
+            signature = self.file_signature(filepath)
+            package_columns = self.parse_package_columns(filepath)
+            self.last_load_source = "csv"
+            if use_cache:
+                self.write_package_columns_cache(filepath, package_columns, signature)
+
+        self.last_load_seconds = time.perf_counter() - start
+        return package_columns
+
+    def parse_package_columns(self, filepath: str) -> PackageColumns:
+        with open(filepath, "r", encoding='utf-8') as lagerstatus_file:
+            header = [column.strip() for column in lagerstatus_file.readline().split(",")]
+
+        return self.parse_package_rows(filepath, header, skiprows=1)
+
+    def parse_package_rows(self, rows, header: list[str], skiprows: int = 0) -> PackageColumns:
+        # rows is a csv filepath or a list of csv lines
+        usecols = [header.index(column) for column in self.COLUMNS]
+        dtype = list(self.COLUMNS.values())
+        rows = np.loadtxt(rows, delimiter=",", skiprows=skiprows, usecols=usecols, dtype=dtype, encoding='utf-8', ndmin=1)
+
+        return PackageColumns(rows["id"], rows["weight"], rows["price_category"], rows["deadline"])
+
+    def stream_package_columns(self, filepath: str = None, batch_size: int = Constants.STREAM_BATCH_SIZE.value, follow: bool = False,
+                               poll_interval: float = Constants.STREAM_POLL_INTERVAL.value, idle_timeout: float = None):
+        # Yields the packages of a csv in batches of at most batch_size. With follow it keeps waiting for rows appended to the
+        # file, like tail -f, until idle_timeout seconds pass without a new row; a row is only read once its line is complete.
+        with open(filepath or self.lagerstatus_filepath, "r", encoding='utf-8', newline="") as lagerstatus_file:
+            header = [column.strip() for column in lagerstatus_file.readline().split(",")]
+            pending = ""
+            idle_since = time.perf_counter()
+            while True:
+                chunk = lagerstatus_file.read(1 << 20)
+                if not chunk:
+                    if not follow or (idle_timeout is not None and time.perf_counter() - idle_since >= idle_timeout):
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                idle_since = time.perf_counter()
+                lines = (pending + chunk).split("\n")
+                pending = lines.pop()
+                lines = [line for line in lines if line.strip()]
+                for start in range(0, len(lines), batch_size):
+                    yield self.parse_package_rows(lines[start:start + batch_size], header)
+
+            if pending.strip():
+                yield self.parse_package_rows([pending], header)
+
+    # Binary sidecar cache: one .npy per column next to the csv, memory-mapped copy-on-write on later loads
+
+    def cache_dirpath(self, filepath: str) -> str:
+        return f"{filepath}.cache"
+
+    def file_signature(self, filepath: str) -> dict:
+        stat = os.stat(filepath)
+        return {"version": self.CACHE_VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": None}
+
+    def file_sha256(self, filepath: str) -> str:
+        sha256 = hashlib.sha256()
+        with open(filepath, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def read_package_columns_cache(self, filepath: str) -> PackageColumns | None:
+        meta_filepath = os.path.join(self.cache_dirpath(filepath), "meta.json")
+        try:
+            with open(meta_filepath, "r", encoding='utf-8') as meta_file:
+                cached_signature = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+
+        signature = self.file_signature(filepath)
+        if cached_signature.get("version") != signature["version"] or cached_signature.get("size") != signature["size"]:
+            return None
+
+        if cached_signature.get("mtime_ns") != signature["mtime_ns"]:
+            # touched but possibly unchanged, only then is it worth hashing the csv
+            signature["sha256"] = self.file_sha256(filepath)
+            if cached_signature.get("sha256") != signature["sha256"]:
+                return None
+            try:
+                self.write_json_atomically(meta_filepath, signature)
+            except OSError:
+                pass
+
+        try:
+            columns = [np.load(self.cache_column_filepath(filepath, name), mmap_mode="c") for name, _ in self.COLUMNS.values()]
+        except (OSError, ValueError):
+            return None
+
+        return PackageColumns(*columns)
+
+    def write_package_columns_cache(self, filepath: str, package_columns: PackageColumns, signature: dict):
+        cache_dirpath = self.cache_dirpath(filepath)
+        meta_filepath = os.path.join(cache_dirpath, "meta.json")
+        try:
+            os.makedirs(cache_dirpath, exist_ok=True)
+            if os.path.exists(meta_filepath):
+                os.remove(meta_filepath) # an interrupted rewrite must not leave a valid-looking cache behind
+
+            for name, _ in self.COLUMNS.values():
+                column_filepath = self.cache_column_filepath(filepath, name)
+                with open(f"{column_filepath}.tmp", "wb") as column_file:
+                    np.save(column_file, getattr(package_columns, self.COLUMN_ATTRIBUTES[name]))
+                os.replace(f"{column_filepath}.tmp", column_filepath)
+
+            signature["sha256"] = self.file_sha256(filepath)
+            self.write_json_atomically(meta_filepath, signature)
+        except OSError as error:
+            print(f"Could not write package cache for {filepath}: {error}", file=sys.stderr) # stdout may be carrying --json results
+
+    def cache_column_filepath(self, filepath: str, name: str) -> str:
+        return os.path.join(self.cache_dirpath(filepath), f"{name}.npy")
+
+    def write_json_atomically(self, filepath: str, data: dict):
+        with open(f"{filepath}.tmp", "w", encoding='utf-8') as file:
+            json.dump(data, file)
+        os.replace(f"{filepath}.tmp", filepath)
+
+    # Stock status write-back: changes are appended to a log next to the csv and folded into a new csv once the log
+    # has grown past STOCK_LOG_COMPACT_RATIO of it. The log names the csv it applies to by size, mtime and content hash,
+    # so a log left behind by a compaction that crashed after replacing the csv is recognized as already applied, while
+    # a csv that was only touched still takes its log.
+
+    def stock_log_filepath(self, filepath: str) -> str:
+        return f"{filepath}.changes"
+
+    def stock_log_base(self, filepath: str) -> dict:
+        stat = os.stat(filepath)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": self.file_sha256(filepath)}
+
+    def read_stock_changes(self, filepath: str) -> list[dict]:
+        try:
+            with open(self.stock_log_filepath(filepath), "r", encoding='utf-8') as log_file:
+                lines = log_file.read().split("\n")
+        except OSError:
+            return []
+
+        if not self.stock_log_is_current(filepath):
+            return []
+        changes = []
+        for line in lines[1:]:
+            try:
+                changes.append(json.loads(line))
+            except ValueError: # the last line of a save that crashed midway, and the empty line after the final newline
+                break
+        return changes
+
+    def apply_stock_changes(self, package_columns: PackageColumns, changes: list[dict]) -> PackageColumns:
+        # every change advances the deadlines of the stock it was saved against, removes rows and then adds or replaces rows
+        for change in changes:
+            if change["days"]:
+                package_columns.advance_days(change["days"])
+            added = PackageColumns(*(change["added"][name] for name in ("ids", "weights", "price_categories", "deadlines")))
+            replaced = np.intersect1d(package_columns.ids, added.ids).tolist()
+            package_columns.remove_ids(change["removed"] + replaced)
+            package_columns.extend(added)
+        return package_columns
+
+    def load_stock_status(self, filepath: str = None) -> PackageColumns:
+        filepath = filepath or self.lagerstatus_filepath
+        return self.apply_stock_changes(self.create_package_columns_from_file(filepath), self.read_stock_changes(filepath))
+
+    def append_stock_changes(self, filepath: str = None, removed_ids=(), added: PackageColumns = None, days: int = 0):
+        # O(changes): one json line with the removed ids, the added or changed rows and the days the deadlines advanced
+        filepath = filepath or self.lagerstatus_filepath
+        added = added if added is not None else PackageColumns([], [], [], [])
+        change = {
+            "days": int(days),
+            "removed": np.asarray(removed_ids, dtype=np.int64).tolist(),
+            "added": {"ids": added.ids.tolist(), "weights": added.weights.tolist(), "price_categories": added.price_categories.tolist(),
+                      "deadlines": added.deadlines.tolist()},
+        }
+
+        log_filepath = self.stock_log_filepath(filepath)
+        if self.stock_log_is_current(filepath):
+            self.truncate_torn_change(log_filepath)
+        else: # no log yet, or one already folded into the csv
+            with open(f"{log_filepath}.tmp", "w", encoding='utf-8') as log_file:
+                log_file.write(json.dumps({"base": self.stock_log_base(filepath)}) + "\n")
+            os.replace(f"{log_filepath}.tmp", log_filepath)
+        with open(log_filepath, "a", encoding='utf-8') as log_file:
+            log_file.write(json.dumps(change) + "\n")
+            log_file.flush()
+            os.fsync(log_file.fileno())
+
+        if os.path.getsize(log_filepath) > Constants.STOCK_LOG_COMPACT_RATIO.value * os.path.getsize(filepath):
+            self.compact_stock_status(filepath)
+
+    def stock_log_is_current(self, filepath: str) -> bool:
+        try:
+            with open(self.stock_log_filepath(filepath), "r", encoding='utf-8') as log_file:
+                base = json.loads(log_file.readline()).get("base") or {}
+            stat = os.stat(filepath)
+        except (OSError, ValueError, AttributeError):
+            return False
+
+        if base.get("size") != stat.st_size:
+            return False
+        # touched but possibly unchanged, only then is it worth hashing the csv
+        return base.get("mtime_ns") == stat.st_mtime_ns or base.get("sha256") == self.file_sha256(filepath)
+
+    def truncate_torn_change(self, log_filepath: str):
+        # a save that crashed midway leaves a line without its newline, cut it off so the next change starts on its own line
+        with open(log_filepath, "r+b") as log_file:
+            end = log_file.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                block_start = max(position - (1 << 16), 0)
+                log_file.seek(block_start)
+                block = log_file.read(position - block_start)
+                newline = block.rfind(b"\n")
+                if newline >= 0:
+                    if block_start + newline + 1 < end:
+                        log_file.truncate(block_start + newline + 1)
+                    return
+                position = block_start
+
+    def update_stock_status(self, packages: PackageColumns | list[Package], filepath: str = None):
+        # Saves packages as the stock in filepath. Only the difference to the saved stock is written: ids that are gone,
+        # rows that are new or changed, and a shift shared by every remaining deadline as days.
+        filepath = filepath or self.lagerstatus_filepath
+        packages = packages if isinstance(packages, PackageColumns) else PackageColumns.from_packages(packages)
+        saved = self.load_stock_status(filepath)
+
+        common_ids, saved_rows, rows = np.intersect1d(saved.ids, packages.ids, return_indices=True)
+        deadline_shifts = saved.deadlines[saved_rows].astype(np.int64) - packages.deadlines[rows]
+        days = int(np.bincount(deadline_shifts - deadline_shifts.min()).argmax() + deadline_shifts.min()) if len(common_ids) > 0 else 0
+        changed = ((saved.weights[saved_rows] != packages.weights[rows]) | (saved.price_categories[saved_rows] != packages.price_categories[rows])
+                   | (deadline_shifts != days))
+
+        removed_ids = np.setdiff1d(saved.ids, packages.ids)
+        added_rows = np.concatenate((np.flatnonzero(~np.isin(packages.ids, saved.ids)), rows[changed]))
+        self.append_stock_changes(filepath, removed_ids, packages.take(np.sort(added_rows)), days)
+
+    def compact_stock_status(self, filepath: str = None):
+        # folds the log into a new csv written next to the old one and renamed over it, so a crash leaves either snapshot whole
+        filepath = filepath or self.lagerstatus_filepath
+        package_columns = self.load_stock_status(filepath)
+        with open(f"{filepath}.tmp", "w", encoding='utf-8', newline="") as lagerstatus_file:
+            lagerstatus_file.write(",".join(self.COLUMNS) + "\n")
+            for start in range(0, len(package_columns), 100_000):
+                rows = slice(start, start + 100_000)
+                lagerstatus_file.writelines(f"{id},{weight},{price_category},{deadline}\n"
+                                            for id, weight, price_category, deadline in zip(package_columns.ids[rows].tolist(), package_columns.weights[rows].tolist(),
+                                                                                          package_columns.price_categories[rows].tolist(), package_columns.deadlines[rows].tolist()))
+            lagerstatus_file.flush()
+            os.fsync(lagerstatus_file.fileno())
+        os.replace(f"{filepath}.tmp", filepath)
+
+        try:
+            os.remove(self.stock_log_filepath(filepath))
+        except OSError:
+            pass
@@ -0,0 +1,59 @@
+from collections import OrderedDict
+import hashlib
+
+import numpy as np
+
+from constants import Constants
+
+class FitnessCache:
+    # Bounded LRU memo of evaluated genomes keyed by a digest of the packed genome bits.
+    # The values depend on the inventory, so one cache must not outlive a genetic algorithm run.
+    def __init__(self, max_size: int = Constants.FITNESS_CACHE_SIZE.value):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    @staticmethod
+    def genome_key(genome: np.ndarray) -> bytes:
+        return hashlib.blake2b(np.packbits(genome).tobytes(), digest_size=16).digest()
+
+    @staticmethod
+    def genome_keys(genomes: np.ndarray) -> list[bytes]:
+        packed_genomes = np.packbits(genomes, axis=1)
+        return [hashlib.blake2b(packed_genome.tobytes(), digest_size=16).digest() for packed_genome in packed_genomes]
+
+    def get(self, key: bytes):
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: bytes, value):
+        if self.max_size <= 0:
+            return
+
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate, "size": len(self._entries), "max_size": self.max_size}
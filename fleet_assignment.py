@@ -0,0 +1,200 @@
+import numpy as np
+
+from constants import Constants
+from knapsack import solve_knapsack_greedy
+from parameters import GAParameters
+from telemetry import Telemetry
+from population_matrix import CROSSOVER_OPERATORS, calculate_repair_order, crossover_genomes, fill_capacity, sample_mutation_positions, select_tournament_winners
+
+WAREHOUSE = -1
+
+class FleetAssignment:
+    # One genome per row assigns every package to a truck index or to WAREHOUSE, so the whole fleet is planned in one run.
+    # Seeded with greedy fleets this is a greedy baseline more than a search: the packages are small against the trucks, so
+    # greedy fleets come within a hundredth of a percent of the fractional upper bound and the GA rarely finds a better row.
+    def __init__(self, weights: np.ndarray, package_fitness: np.ndarray, capacities: np.ndarray, genomes: np.ndarray,
+                 crossover_operator: str = Constants.CROSSOVER_OPERATOR.value, telemetry: Telemetry = None, parameters: GAParameters = None):
+        if crossover_operator not in CROSSOVER_OPERATORS:
+            raise ValueError(f"Unknown crossover operator {crossover_operator}, expected one of {tuple(CROSSOVER_OPERATORS)}")
+
+        self.weights = weights
+        self.package_fitness = package_fitness
+        self.capacities = capacities
+        self.genomes = genomes
+        self.amt_trucks = len(capacities)
+        self.amt_packages = len(weights)
+        self.crossover_operator = crossover_operator
+        self.telemetry = telemetry if telemetry is not None else Telemetry()
+        self.parameters = parameters if parameters is not None else GAParameters()
+
+        self._truck_weights = None
+        self._fitness = None
+        self._repair_order = None
+
+        self.amt_children = 0
+        self.amt_repaired = 0
+        self.amt_evaluated = 0
+
+    @property
+    def population_size(self) -> int:
+        return len(self.genomes)
+
+    @property
+    def truck_weights(self) -> np.ndarray:
+        self.evaluate()
+        return self._truck_weights
+
+    @property
+    def fitness(self) -> np.ndarray:
+        self.evaluate()
+        return self._fitness
+
+    @property
+    def repair_order(self) -> np.ndarray:
+        # package indices from lowest to highest value per kg, with the weight term counted like the single truck engines do
+        if self._repair_order is None:
+            self._repair_order = calculate_repair_order(self.weights, self.package_fitness, self.parameters.weight_weight)
+        return self._repair_order
+
+    def evaluate(self):
+        if self._fitness is not None:
+            return
+
+        with self.telemetry.phase("evaluation"):
+            self._evaluate()
+
+    def _evaluate(self):
+        assigned = self.genomes != WAREHOUSE
+        bins = np.nonzero(assigned)[0] * self.amt_trucks + self.genomes[assigned]
+        assigned_packages = np.nonzero(assigned)[1]
+        amt_bins = self.population_size * self.amt_trucks
+
+        self._truck_weights = np.bincount(bins, weights=self.weights[assigned_packages], minlength=amt_bins).reshape(self.population_size, self.amt_trucks).round(2)
+        truck_package_fitness = np.bincount(bins, weights=self.package_fitness[assigned_packages], minlength=amt_bins).reshape(self.population_size, self.amt_trucks)
+
+        # same score as Solution.fitness summed over the trucks, a row with any overloaded truck cannot be loaded and scores 0
+        # a truck without capacity left can only score its empty load
+        normalized_truck_weights = np.divide(self._truck_weights, self.capacities, out=np.zeros_like(self._truck_weights), where=self.capacities > 0)
+        normalized_truck_weights *= self.parameters.weight_weight
+        feasible = (self._truck_weights <= self.capacities).all(axis=1)
+        self._fitness = np.where(feasible, (truck_package_fitness + normalized_truck_weights).sum(axis=1), 0.0)
+        self.amt_evaluated = self.population_size
+
+    def average_fitness(self) -> float:
+        return float(self.fitness.mean())
+
+    def feasible_ratio(self) -> float:
+        return float((self.truck_weights <= self.capacities).all(axis=1).mean())
+
+    def best_index(self) -> int:
+        return int(np.argmax(self.fitness))
+
+    def worst_index(self) -> int:
+        return int(np.argmin(self.fitness))
+
+    def truck_indices(self, row: int, truck: int) -> np.ndarray:
+        return np.flatnonzero(self.genomes[row] == truck)
+
+    @classmethod
+    def generate_random(cls, weights: np.ndarray, package_fitness: np.ndarray, capacities: np.ndarray, population_size: int, rng: np.random.Generator,
+                        crossover_operator: str = Constants.CROSSOVER_OPERATOR.value, telemetry: Telemetry = None, parameters: GAParameters = None):
+        return cls(weights, package_fitness, capacities, generate_random_assignments(weights, capacities, population_size, rng), crossover_operator, telemetry,
+                   parameters)
+
+    def with_packages(self, weights: np.ndarray, package_fitness: np.ndarray) -> "FleetAssignment":
+        # packages appended to the inventory start in the warehouse of every genome
+        genomes = np.full((self.population_size, len(weights)), WAREHOUSE, dtype=np.int8)
+        genomes[:, :self.amt_packages] = self.genomes
+        return FleetAssignment(weights, package_fitness, self.capacities, genomes, self.crossover_operator, self.telemetry, self.parameters)
+
+    def generate_next_generation(self, counter_avg_seen: int, rng: np.random.Generator) -> "FleetAssignment":
+        population_size = self.population_size
+        telemetry = self.telemetry
+        parameters = self.parameters
+        with telemetry.phase("elitism"):
+            amt_elites = min(parameters.elitism_participants, population_size)
+            elite_genomes = self.genomes[np.argsort(self.fitness)[::-1][:amt_elites]]
+
+        amt_pairs = (population_size - amt_elites + 1) // 2
+        with telemetry.phase("selection"):
+            parents = select_tournament_winners(self.fitness, 2 * amt_pairs, parameters.amt_tournament_participants, rng)
+        with telemetry.phase("crossover"):
+            children = crossover_genomes(self.genomes[parents[:amt_pairs]], self.genomes[parents[amt_pairs:]], rng, self.crossover_operator,
+                                         parameters.crossover_rate)[:population_size - amt_elites]
+
+        with telemetry.phase("mutation"):
+            mutation_rate = min(parameters.mutation_rate * counter_avg_seen, parameters.max_mutation_rate)
+            self.mutate(children, mutation_rate, rng)
+
+        next_generation = FleetAssignment(self.weights, self.package_fitness, self.capacities, np.concatenate((elite_genomes, children)), self.crossover_operator,
+                                          telemetry, parameters)
+        next_generation._repair_order = self._repair_order
+        next_generation.amt_children = population_size - amt_elites
+        if parameters.repair_children:
+            next_generation.evaluate() # repair needs the truck weights, keep their evaluation out of the repair timing
+            with telemetry.phase("repair"):
+                next_generation.amt_repaired = next_generation.repair()
+        return next_generation
+
+    def mutate(self, genomes: np.ndarray, mutation_rate: float, rng: np.random.Generator):
+        positions = sample_mutation_positions(genomes.size, mutation_rate, rng)
+        genomes.reshape(-1)[positions] = rng.integers(WAREHOUSE, self.amt_trucks, size=len(positions))
+
+    def repair(self) -> int:
+        # Sends the lowest fitness per kg packages of an overloaded truck back to the warehouse until it fits, then fills
+        # every truck's spare capacity with the best fitness per kg packages left in the warehouse, one truck after another.
+        # Works row by row and returns how many rows had an overloaded truck.
+        truck_weights = self.truck_weights.copy()
+        repair_order = self.repair_order
+        ranks = np.empty(self.amt_packages, dtype=np.int64)
+        ranks[repair_order] = np.arange(self.amt_packages)
+        fill_order = repair_order[::-1]
+
+        amt_repaired = 0
+        for genome, row_weights in zip(self.genomes, truck_weights):
+            overloaded = np.flatnonzero(row_weights > self.capacities)
+            if len(overloaded) > 0:
+                amt_repaired += 1
+                assigned = np.flatnonzero(genome != WAREHOUSE)
+                for truck in overloaded.tolist():
+                    in_truck = assigned[genome[assigned] == truck]
+                    in_truck = in_truck[np.argsort(ranks[in_truck], kind="stable")]
+                    in_truck_weights = self.weights[in_truck]
+                    weight_before = np.cumsum(in_truck_weights) - in_truck_weights
+                    unload = weight_before < row_weights[truck] - self.capacities[truck]
+                    genome[in_truck[unload]] = WAREHOUSE
+                    row_weights[truck] -= in_truck_weights[unload].sum()
+
+            for truck in range(self.amt_trucks):
+                fill_capacity(genome, fill_order, self.weights, self.capacities[truck] - row_weights[truck], WAREHOUSE, truck)
+
+        self._truck_weights = None
+        self._fitness = None
+        return amt_repaired
+
+def generate_random_assignments(weights: np.ndarray, capacities: np.ndarray, amt_assignments: int, rng: np.random.Generator) -> np.ndarray:
+    # Every row shuffles the packages and cuts the cumulative weight at the trucks' cumulative capacities, packages
+    # straddling a cut stay in the warehouse. Rows are cut one at a time, so memory stays at the genome matrix.
+    genomes = np.empty((amt_assignments, len(weights)), dtype=np.int8)
+    capacity_bounds = np.cumsum(capacities)
+    for genome in genomes:
+        permutation = rng.permutation(len(weights))
+        permuted_weights = weights[permutation]
+        cumulative_weights = np.cumsum(permuted_weights)
+
+        end_trucks = np.searchsorted(capacity_bounds, cumulative_weights, side="left")
+        start_trucks = np.searchsorted(capacity_bounds, cumulative_weights - permuted_weights, side="right")
+        genome[permutation] = np.where((end_trucks == start_trucks) & (end_trucks < len(capacities)), end_trucks, WAREHOUSE)
+    return genomes
+
+def generate_greedy_assignments(weights: np.ndarray, values: np.ndarray, capacities: np.ndarray, amt_assignments: int, rng: np.random.Generator,
+                                noise: float = Constants.GREEDY_SEED_NOISE.value) -> np.ndarray:
+    # Loads the trucks one after another with the greedy knapsack answer for the packages still in the warehouse. The first
+    # row ranks packages by value per kg like the greedy engine, the others by randomly perturbed values to stay diverse.
+    genomes = np.full((amt_assignments, len(weights)), WAREHOUSE, dtype=np.int8)
+    for row, genome in enumerate(genomes):
+        row_values = values if row == 0 else values * rng.lognormal(0, noise, len(values))
+        order = np.argsort(-row_values / np.maximum(weights, 1e-9), kind="stable")
+        for truck, capacity in enumerate(capacities.tolist()):
+            genome[solve_knapsack_greedy(weights, row_values, capacity, order[genome[order] == WAREHOUSE])] = truck
+    return genomes
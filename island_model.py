@@ -0,0 +1,168 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+import time
+
+import numpy as np
+
+from constants import Constants
+from fitness_cache import FitnessCache
+from parameters import GAParameters
+from population_matrix import PopulationMatrix
+from telemetry import Telemetry
+
+class IslandModel:
+    # Independent populations evolved in a process pool. Package vectors and every island's genomes live in
+    # shared memory so only seeds and a few scalars cross the process boundary.
+    def __init__(self, weights: np.ndarray, price_categories: np.ndarray, package_fitness: np.ndarray, rng: np.random.Generator,
+                 amt_islands: int = Constants.AMT_ISLANDS.value, population_size: int = None,
+                 migration_interval: int = Constants.MIGRATION_INTERVAL.value, amt_migrants: int = Constants.AMT_MIGRANTS.value,
+                 repair: bool = Constants.CHILD_REPAIR.value == "greedy", crossover_operator: str = Constants.CROSSOVER_OPERATOR.value,
+                 telemetry: Telemetry = None, parameters: GAParameters = None):
+        self.rng = rng
+        self.parameters = parameters if parameters is not None else GAParameters()
+        self.telemetry = telemetry if telemetry is not None else Telemetry()
+        self.repair = repair
+        self.crossover_operator = crossover_operator
+        self.amt_islands = amt_islands
+        self.migration_interval = migration_interval
+        self.amt_migrants = amt_migrants
+        self.shape = (amt_islands, population_size if population_size is not None else self.parameters.population_size, len(weights))
+
+        package_vectors = np.vstack((weights, price_categories, package_fitness)).astype(np.float64)
+        self.packages_shm = SharedMemory(create=True, size=max(package_vectors.nbytes, 1))
+        np.ndarray(package_vectors.shape, dtype=np.float64, buffer=self.packages_shm.buf)[:] = package_vectors
+        self.genomes_shm = SharedMemory(create=True, size=max(int(np.prod(self.shape)), 1))
+
+        self.fitness = np.zeros(self.shape[:2])
+        self.counter_avg_seen = np.zeros(amt_islands, dtype=int)
+        self.best_fitness = np.zeros(amt_islands)
+        self.seeded = False # islands start from the genomes given to seed instead of random loads
+        self.generation = 0
+        self.history = [] # (perf_counter timestamp, best fitness over all islands) after every migration
+
+    @property
+    def genomes(self) -> np.ndarray:
+        return np.ndarray(self.shape, dtype=bool, buffer=self.genomes_shm.buf)
+
+    def seed(self, initial_genomes: np.ndarray):
+        # one population per island, written straight into the shared genomes
+        self.genomes[:] = initial_genomes
+        self.seeded = True
+
+    def converged(self) -> np.ndarray:
+        return self.counter_avg_seen >= self.parameters.generations
+
+    def run(self, executor: ProcessPoolExecutor, deadline: float = None) -> tuple[int, int]:
+        # deadline is a perf_counter timestamp, every island checks it between its generations
+        with self.telemetry.phase("initialization"):
+            self.evolve(executor, 0, initialize=True)
+        self.record_generation()
+
+        max_generations = self.parameters.max_generations
+        while not self.converged().all() and self.generation < max_generations and (deadline is None or time.perf_counter() < deadline):
+            generations = min(self.migration_interval, max_generations - self.generation)
+            with self.telemetry.phase("evolution"):
+                self.evolve(executor, generations, deadline=deadline)
+            self.generation += generations
+            with self.telemetry.phase("migration"):
+                self.migrate()
+            self.record_generation()
+
+        return self.best_index()
+
+    def record_generation(self):
+        self.history.append((time.perf_counter(), float(self.fitness.max())))
+        if self.telemetry.enabled:
+            self.telemetry.record_generation(self.generation, self.fitness, (self.fitness > 0).mean(), self.fitness.size, engine="island",
+                                             island_best_fitness=self.fitness.max(axis=1).tolist())
+
+    def evolve(self, executor: ProcessPoolExecutor, generations: int, initialize: bool = False, deadline: float = None):
+        islands = [island for island in range(self.amt_islands) if initialize or not self.converged()[island]]
+        seeds = self.rng.integers(2 ** 63, size=len(islands))
+        futures = {
+            island: executor.submit(evolve_island, self.packages_shm.name, self.genomes_shm.name, self.shape, island, generations,
+                                    int(self.counter_avg_seen[island]), float(self.best_fitness[island]), initialize, int(seed), self.repair, self.crossover_operator,
+                                    self.parameters, self.seeded, deadline)
+            for island, seed in zip(islands, seeds)
+        }
+        for island, future in futures.items():
+            self.fitness[island], self.counter_avg_seen[island], self.best_fitness[island] = future.result()
+
+    def migrate(self):
+        # ring topology: each island's best solutions replace the worst solutions of the next island
+        if self.amt_islands < 2 or self.amt_migrants < 1:
+            return
+
+        genomes = self.genomes
+        ranked = np.argsort(self.fitness, axis=1)
+        migrants = [(genomes[island, ranked[island, -self.amt_migrants:]].copy(), self.fitness[island, ranked[island, -self.amt_migrants:]].copy())
+                    for island in range(self.amt_islands)]
+
+        for island in range(self.amt_islands):
+            target = (island + 1) % self.amt_islands
+            migrant_genomes, migrant_fitness = migrants[island]
+            worst_rows = ranked[target, :self.amt_migrants]
+            genomes[target, worst_rows] = migrant_genomes
+            self.fitness[target, worst_rows] = migrant_fitness
+            # better migrants are not an improvement of the island's own, its convergence count carries on
+            self.best_fitness[target] = max(self.best_fitness[target], migrant_fitness.max())
+
+    def best_index(self) -> tuple[int, int]:
+        island, row = np.unravel_index(np.argmax(self.fitness), self.fitness.shape)
+        return int(island), int(row)
+
+    def include_indices(self, island: int, row: int) -> list[int]:
+        return np.flatnonzero(self.genomes[island, row]).tolist()
+
+    def close(self):
+        for shm in (self.packages_shm, self.genomes_shm):
+            shm.close()
+            shm.unlink()
+
+def evolve_island(packages_name: str, genomes_name: str, shape: tuple[int, int, int], island: int, generations: int,
+                  counter_avg_seen: int, best_fitness: float, initialize: bool, seed: int, repair: bool, crossover_operator: str, parameters: GAParameters = None,
+                  seeded: bool = False, deadline: float = None):
+    packages_shm = SharedMemory(name=packages_name)
+    genomes_shm = SharedMemory(name=genomes_name)
+    try:
+        return _evolve_island(packages_shm, genomes_shm, shape, island, generations, counter_avg_seen, best_fitness, initialize, seed, repair, crossover_operator,
+                              parameters, seeded, deadline)
+    finally:
+        packages_shm.close()
+        genomes_shm.close()
+
+def _evolve_island(packages_shm: SharedMemory, genomes_shm: SharedMemory, shape: tuple[int, int, int], island: int, generations: int,
+                   counter_avg_seen: int, best_fitness: float, initialize: bool, seed: int, repair: bool, crossover_operator: str, parameters: GAParameters = None,
+                   seeded: bool = False, deadline: float = None):
+    # perf_counter is a system-wide monotonic clock on Linux and macOS, so the parent's deadline holds in the worker
+    parameters = parameters if parameters is not None else GAParameters()
+    amt_islands, population_size, amt_packages = shape
+    weights, price_categories, package_fitness = np.ndarray((3, amt_packages), dtype=np.float64, buffer=packages_shm.buf)
+    genomes = np.ndarray(shape, dtype=bool, buffer=genomes_shm.buf)[island]
+    rng = np.random.default_rng(seed)
+    fitness_cache = FitnessCache() # lives for the generations between two migrations
+
+    if initialize and not seeded:
+        population = PopulationMatrix.generate_random(weights, price_categories, package_fitness, population_size, rng, repair=repair, crossover_operator=crossover_operator,
+                                                   fitness_cache=fitness_cache, parameters=parameters)
+    else:
+        population = PopulationMatrix(weights, price_categories, package_fitness, genomes.copy(), repair, crossover_operator=crossover_operator,
+                                      fitness_cache=fitness_cache, parameters=parameters)
+    if initialize:
+        best_fitness = population.fitness[population.best_index()]
+
+    for _ in range(generations):
+        if counter_avg_seen >= parameters.generations or (deadline is not None and time.perf_counter() >= deadline):
+            break
+
+        population = population.generate_next_generation(counter_avg_seen, rng)
+        next_best_fitness = population.fitness[population.best_index()]
+
+        if abs(best_fitness - next_best_fitness) <= parameters.fitness_delta_threshold:
+            counter_avg_seen += 1
+        else:
+            counter_avg_seen = 0
+        best_fitness = next_best_fitness
+
+    genomes[:] = population.genomes
+    return population.fitness.copy(), counter_avg_seen, float(best_fitness)
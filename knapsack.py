@@ -0,0 +1,72 @@
+import numpy as np
+
+from constants import Constants
+
+def package_values(weights: np.ndarray, package_fitness: np.ndarray, weight_weight: float = Constants.WEIGHT_WEIGHT.value) -> np.ndarray:
+    # Solution.fitness is linear in the included packages, so each package adds its own fitness plus its share of the weight term
+    return package_fitness + weights / Constants.WEIGHT_LIMIT.value * weight_weight
+
+def solve_knapsack_greedy(weights: np.ndarray, values: np.ndarray, capacity: float, order: np.ndarray = None) -> np.ndarray:
+    # order restricts and ranks the candidates when it is given, otherwise all packages are ranked by value per kg
+    if order is None:
+        order = np.argsort(-values / np.maximum(weights, 1e-9), kind="stable")
+
+    # take the longest prefix that fits in one go, then keep scanning for smaller packages that fill the gap
+    cumulative_weights = np.cumsum(weights[order])
+    amt_prefix = int(np.searchsorted(cumulative_weights, capacity, side="right"))
+    selected = order[:amt_prefix].tolist()
+    remaining_capacity = capacity - (cumulative_weights[amt_prefix - 1] if amt_prefix > 0 else 0)
+
+    min_remaining_weight = weights[order[amt_prefix:]].min() if amt_prefix < len(order) else np.inf
+    for index in order[amt_prefix:]:
+        if remaining_capacity < min_remaining_weight:
+            break
+        if weights[index] <= remaining_capacity and values[index] > 0:
+            selected.append(int(index))
+            remaining_capacity -= weights[index]
+
+    return np.array(sorted(selected), dtype=np.int64)
+
+def generate_greedy_loads(weights: np.ndarray, values: np.ndarray, amt_loads: int, capacity: float, rng: np.random.Generator,
+                          noise: float = Constants.GREEDY_SEED_NOISE.value) -> np.ndarray:
+    # the first load is the plain greedy answer, the others rank packages by randomly perturbed values to stay diverse
+    genomes = np.zeros((amt_loads, len(weights)), dtype=bool)
+    for row in range(amt_loads):
+        row_values = values if row == 0 else values * rng.lognormal(0, noise, len(values))
+        genomes[row, solve_knapsack_greedy(weights, row_values, capacity)] = True
+    return genomes
+
+def solve_knapsack_dp(weights: np.ndarray, values: np.ndarray, capacity: float, resolution: int = Constants.KNAPSACK_RESOLUTION.value,
+                      max_items: int = Constants.KNAPSACK_MAX_ITEMS.value) -> np.ndarray:
+    # Exact 0/1 knapsack over weights in 1/resolution kg units. Weights are rounded up, so the answer never exceeds capacity.
+    # With more than max_items candidates only the best max_items by value per kg are considered.
+    candidates = np.flatnonzero(values > 0)
+    integer_weights = np.ceil(weights[candidates] * resolution - 1e-9).astype(np.int64)
+    integer_capacity = int(np.floor(capacity * resolution + 1e-9))
+
+    free = integer_weights <= 0
+    selected = candidates[free].tolist()
+    candidates, integer_weights = candidates[~free], integer_weights[~free]
+
+    fits = integer_weights <= integer_capacity
+    candidates, integer_weights = candidates[fits], integer_weights[fits]
+
+    if len(candidates) > max_items:
+        best = np.argsort(-values[candidates] / integer_weights, kind="stable")[:max_items]
+        candidates, integer_weights = candidates[best], integer_weights[best]
+
+    best_values = np.zeros(integer_capacity + 1)
+    taken = np.zeros((len(candidates), (integer_capacity + 1 + 7) // 8), dtype=np.uint8) # one packed bit per capacity cell
+    for item, (weight, value) in enumerate(zip(integer_weights.tolist(), values[candidates].tolist())):
+        with_item = best_values[:integer_capacity + 1 - weight] + value
+        better = with_item > best_values[weight:]
+        best_values[weight:] = np.where(better, with_item, best_values[weight:])
+        taken[item] = np.packbits(np.concatenate((np.zeros(weight, dtype=bool), better)))
+
+    remaining_capacity = integer_capacity
+    for item in range(len(candidates) - 1, -1, -1):
+        if taken[item, remaining_capacity >> 3] & (0x80 >> (remaining_capacity & 7)):
+            selected.append(int(candidates[item]))
+            remaining_capacity -= int(integer_weights[item])
+
+    return np.array(sorted(selected), dtype=np.int64)
@@ -1,62 +1,173 @@
 from shipping_company import ShippingCompany
+from filehandler import FileHandler
+from telemetry import JsonLinesSink, Telemetry
+from package_feed import PackageFeed
+from parameters import GAParameters
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import os
+import sys
+import time
+import matplotlib
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import numpy as np
 
-RUN_ONLY_1_DAY = True # built for multiday simulation
-
-def main():
-    lindas_delivery_company = ShippingCompany()
-
-    day = 0
-    while lindas_delivery_company.amt_packages > 0:
-        lindas_delivery_company.reset_fleet()
-        print(f"day {day} starts with {len(lindas_delivery_company.packages)} packages")
-
-        lindas_delivery_company.load_fleet()
-
-        print("\nResults:")
-        for truck in lindas_delivery_company.fleet:
-            truck.print_report()
-
-            weight_data = [package.weight for package in truck.packages]
-            price_category_data = [package.price_category for package in truck.packages]
-            show_subplot(weight_data, "Frequency", "weight in kg", f"Truck {truck.id} weight data")
-            show_subplot(price_category_data, "Frequency", "Price category", f"Truck {truck.id} price category data")
-
-        day += 1
-
-        if RUN_ONLY_1_DAY: break
-
-        lindas_delivery_company.increment_late_days()
-
-    print(f"{lindas_delivery_company.amt_packages} packages remaining")
-    print(f"{lindas_delivery_company.calculate_profit_fleet()} profit made today")
-    print(f"{lindas_delivery_company.calculate_sum_price_inventory()} profit remaining in inventory")
-    print(f"\n\nInitial late fees: {lindas_delivery_company.initial_late_fees}")
-    print(f"{lindas_delivery_company.calculate_late_fees_fleet()} sek late fee remaining")
-
-    weight_data = [package.weight for package in lindas_delivery_company.packages]
-    price_category_data = [package.price_category for package in lindas_delivery_company.packages]
-
-    show_subplot(weight_data, "Frequency", "weight in kg", "Inventory weight data after day 1")
-    show_subplot(price_category_data, "Frequency", "Price category", "Inventory price category data after day 1")
-
-def show_subplot(data: list, ylabel: str, xlabel: str, title: str):
+def main(argv: list[str] = None) -> int:
+    args = parse_args(argv)
+    headless = args.output_dir is not None
+    if headless:
+        matplotlib.use("Agg") # never open a window, even if a plot slips through to pyplot
+        os.makedirs(args.output_dir, exist_ok=True)
+    log = sys.stderr if args.json else sys.stdout # with --json, stdout only carries the results
+
+    start = time.perf_counter()
+    telemetry_sink = JsonLinesSink(args.telemetry) if args.telemetry else None
+    filehandler = FileHandler()
+    packages = filehandler.load_stock_status(args.inventory) if args.save_stock else filehandler.create_package_columns_from_file(args.inventory)
+    package_feed = PackageFeed(filehandler.stream_package_columns(args.stream, follow=True)) if args.stream else None
+    lindas_delivery_company = ShippingCompany(packages, engine=args.engine, telemetry=Telemetry(telemetry_sink), warm_start=args.warm_start,
+                                              checkpoint_dir=args.checkpoint_dir, resume=args.resume, time_budget=args.time_budget, package_feed=package_feed,
+                                              parameters=GAParameters.load(args.profile) if args.profile else None)
+    print(f"Loaded {lindas_delivery_company.amt_packages} packages from {filehandler.last_load_source} in {filehandler.last_load_seconds * 1000:.1f} ms", file=log)
+
+    plot_executor = ProcessPoolExecutor(max_workers=1) if headless and args.plots == "save" and args.background_plots else None
+    plots = []
+    plot_futures = []
+    try:
+        def add_plot(data, ylabel: str, xlabel: str, title: str, filename: str):
+            # with a plot worker every histogram is rendered while the next days are still being planned
+            plots.append((data, ylabel, xlabel, title, filename))
+            if plot_executor is not None:
+                plot_futures.append(plot_executor.submit(save_histogram, np.asarray(data), ylabel, xlabel, title, os.path.join(args.output_dir, filename)))
+            elif not headless:
+                show_subplot(data, ylabel, xlabel, title)
+
+        def finish_day(day_report: dict):
+            day = day_report["day"]
+            print(f"day {day} loaded {day_report['packages_loaded']} packages in {day_report['seconds']:.2f} s", file=log)
+            if args.save_stock:
+                lindas_delivery_company.save_stock_status(args.inventory)
+
+            print("\nResults:", file=log)
+            for truck in lindas_delivery_company.fleet:
+                truck.print_report(file=log)
+
+                add_plot(truck.packages.weights, "Frequency", "weight in kg", f"Day {day} truck {truck.id} weight data", f"day_{day}_truck_{truck.id}_weight.png")
+                add_plot(truck.packages.price_categories, "Frequency", "Price category", f"Day {day} truck {truck.id} price category data",
+                         f"day_{day}_truck_{truck.id}_price_category.png")
+
+        day_reports = lindas_delivery_company.simulate_days(args.days, finish_day)
+        day = len(day_reports)
+        print(f"{lindas_delivery_company.amt_packages} packages remaining", file=log)
+        print(f"{sum(day_report['profit'] for day_report in day_reports)} profit made in {day} days", file=log)
+        print(f"{lindas_delivery_company.calculate_sum_price_inventory()} profit remaining in inventory", file=log)
+        print(f"\n\nInitial late fees: {lindas_delivery_company.initial_late_fees}", file=log)
+        print(f"{sum(day_report['fleet_late_fees'] for day_report in day_reports)} sek late fee remaining", file=log)
+
+        add_plot(lindas_delivery_company.packages.weights, "Frequency", "weight in kg", f"Inventory weight data after day {day}", "inventory_weight.png")
+        add_plot(lindas_delivery_company.packages.price_categories, "Frequency", "Price category", f"Inventory price category data after day {day}",
+                 "inventory_price_category.png")
+        if not headless:
+            return 0
+
+        results = {
+            "engine": args.engine,
+            "warm_start": args.warm_start,
+            "time_budget": args.time_budget,
+            "profile": lindas_delivery_company.parameters.to_dict(),
+            "packages_remaining": lindas_delivery_company.amt_packages,
+            "profit": sum(day_report["profit"] for day_report in day_reports),
+            "inventory_profit_remaining": lindas_delivery_company.calculate_sum_price_inventory(),
+            "initial_late_fees": lindas_delivery_company.initial_late_fees,
+            "fleet_late_fees": sum(day_report["fleet_late_fees"] for day_report in day_reports),
+            "inventory_late_fees": lindas_delivery_company.packages.total_late_fees,
+            "days": day_reports,
+            "histograms": {filename.removesuffix(".png"): histogram_stats(data) for data, _, _, _, filename in plots},
+            "plots": [],
+        }
+
+        if plot_executor is not None:
+            results["plots"] = [future.result() for future in plot_futures]
+        elif args.plots == "save":
+            results["plots"] = [save_histogram(np.asarray(data), ylabel, xlabel, title, os.path.join(args.output_dir, filename))
+                                for data, ylabel, xlabel, title, filename in plots]
+
+        results["seconds"] = time.perf_counter() - start
+        write_results(os.path.join(args.output_dir, "results.json"), results)
+        if args.json:
+            print(json.dumps(results))
+        return 0
+    finally:
+        if plot_executor is not None:
+            plot_executor.shutdown()
+        if package_feed is not None:
+            package_feed.close()
+            print(f"Streamed {package_feed.amt_packages} packages at {package_feed.packages_per_second or 0:.0f} packages/s", file=log)
+        if telemetry_sink is not None:
+            telemetry_sink.close()
+
+def parse_args(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Load the fleet from the inventory file and report the result.")
+    parser.add_argument("--inventory", default=None, help="inventory csv, defaults to Constants.LAGERSTATUS_FILEPATH")
+    parser.add_argument("--engine", default="solution", choices=ShippingCompany.ENGINES)
+    parser.add_argument("--days", type=int, default=1, help="days to simulate, every day ships one fleet load and moves all deadlines one day closer")
+    parser.add_argument("--warm-start", action="store_true", help="start every day's GA from the previous day's surviving population")
+    parser.add_argument("--stream", default=None, help="append-only csv of arriving packages, followed while planning and added to the inventory as rows arrive")
+    parser.add_argument("--save-stock", action="store_true", help="start from the saved stock status and save what every day shipped back to the inventory's change log")
+    parser.add_argument("--profile", default=None, help="GA parameter profile json, as written by tuning.py --save-profile, defaults to the Constants")
+    parser.add_argument("--time-budget", type=float, default=None, help="seconds for planning each day's fleet, every truck's GA returns its best load so far when its share runs out")
+    parser.add_argument("--output-dir", default=None, help="run headless and write results.json and the plots to this directory")
+    parser.add_argument("--plots", default="save", choices=("save", "none"), help="headless only: save histogram images or only their summary stats")
+    parser.add_argument("--background-plots", action="store_true", help="headless only: render the histogram images in a worker process")
+    parser.add_argument("--json", action="store_true", help="headless only: print the results as one JSON line on stdout, everything else goes to stderr")
+    parser.add_argument("--checkpoint-dir", default=None, help="save the GA population of every planned truck to this directory while it evolves")
+    parser.add_argument("--resume", action="store_true", help="continue from the checkpoints in --checkpoint-dir, or seed from them if the inventory changed")
+    parser.add_argument("--telemetry", default=None, help="append GA telemetry records to this JSON lines file")
+    args = parser.parse_args(argv)
+    if args.json and args.output_dir is None:
+        parser.error("--json needs --output-dir")
+    if args.resume and args.checkpoint_dir is None:
+        parser.error("--resume needs --checkpoint-dir")
+    return args
+
+def write_results(filepath: str, results: dict):
+    with open(f"{filepath}.tmp", "w", encoding='utf-8') as results_file:
+        json.dump(results, results_file, indent=2)
+    os.replace(f"{filepath}.tmp", filepath)
+
+def histogram_stats(data) -> dict:
+    if len(data) == 0:
+        return {"count": 0}
+    return {"count": len(data), "median": float(np.median(data)), "variance": float(np.var(data)), "std": float(np.std(data))}
+
+def draw_histogram(axes, data, ylabel: str, xlabel: str, title: str):
     median = np.median(data)
     variance = np.var(data)
     std = np.std(data)
 
-    plt.hist(data, label=f"Variance {variance:.2f}", color='xkcd:eggshell')
-    plt.title(title)
-    plt.ylabel(ylabel)
-    plt.xlabel(xlabel)
+    axes.hist(data, label=f"Variance {variance:.2f}", color='xkcd:eggshell')
+    axes.set_title(title)
+    axes.set_ylabel(ylabel)
+    axes.set_xlabel(xlabel)
+
+    axes.axvline(median, color='m', label=f'Median: {median:.2f}')
+    axes.axvline(median + std, color='0.8', label=f'standard deviation: +{std:.2f}')
+    axes.axvline(median - std, color='0.8', label=f'standard deviation: -{std:.2f}')
 
-    plt.axvline(median, color='m', label=f'Median: {median:.2f}')
-    plt.axvline(median + std, color='0.8', label=f'standard deviation: +{std:.2f}')
-    plt.axvline(median - std, color='0.8', label=f'standard deviation: -{std:.2f}')
+    axes.legend()
 
-    plt.legend()
+def show_subplot(data: list, ylabel: str, xlabel: str, title: str):
+    draw_histogram(plt.gca(), data, ylabel, xlabel, title)
     plt.show()
 
+def save_histogram(data, ylabel: str, xlabel: str, title: str, filepath: str) -> str:
+    # Figure without pyplot renders with Agg and never touches a GUI, so it is also safe in a worker process
+    figure = Figure()
+    draw_histogram(figure.subplots(), data, ylabel, xlabel, title)
+    figure.savefig(filepath)
+    return filepath
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
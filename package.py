@@ -1,6 +1,12 @@
+from collections import Counter
+
+import numpy as np
+
 from constants import Constants
 
 class Package():
+    __slots__ = ("id", "weight", "price_category", "_days_to_deadline", "late_fee")
+
     def __init__(self, id: int, weight: float, price_category: int, days_to_deadline):
         self.id = id
         self.weight = weight
@@ -27,3 +33,152 @@ class Package():
             normalized_deadline_penalty = 0
 
         return normalized_price_category + normalized_deadline_penalty
+
+class PackageColumns:
+    # Inventory stored as one typed array per field; indexing returns a Package copy of that row.
+    # Rows have no fixed order: removing rows moves the last rows into the gaps. The deadline histogram, the price and
+    # late fee totals and the id -> row index are updated with every change instead of rescanning the columns.
+    COLUMNS = ("ids", "weights", "price_categories", "deadlines", "late_fees")
+
+    def __init__(self, ids: np.ndarray, weights: np.ndarray, price_categories: np.ndarray, deadlines: np.ndarray, late_fees: np.ndarray = None):
+        self.ids = np.ascontiguousarray(ids, dtype=np.int64)
+        self.weights = np.ascontiguousarray(weights, dtype=np.float64)
+        self.price_categories = np.ascontiguousarray(price_categories, dtype=np.int8)
+        self.deadlines = np.ascontiguousarray(deadlines, dtype=np.int16)
+        self.late_fees = np.ascontiguousarray(late_fees, dtype=np.int32) if late_fees is not None else self.calculate_late_fees(self.deadlines)
+
+        self.deadline_counts = self.count_deadlines(self.deadlines)
+        self.total_price_category = int(self.price_categories.sum())
+        self.total_late_fees = int(self.late_fees.sum())
+        self._positions = None # id -> row, built on the first lookup
+
+    @staticmethod
+    def count_values(column: np.ndarray) -> Counter:
+        values, amounts = np.unique(column, return_counts=True)
+        return Counter(dict(zip(values.tolist(), amounts.tolist())))
+
+    @staticmethod
+    def count_deadlines(deadlines: np.ndarray) -> Counter:
+        return PackageColumns.count_values(deadlines)
+
+    @property
+    def min_deadline(self) -> int:
+        return min(self.deadline_counts) if self.deadline_counts else 0
+
+    @property
+    def max_deadline(self) -> int:
+        return max(self.deadline_counts) if self.deadline_counts else 0
+
+    @property
+    def amt_late(self) -> int:
+        return sum(amount for deadline, amount in self.deadline_counts.items() if deadline < 0)
+
+    def position(self, id: int) -> int:
+        if self._positions is None:
+            self._positions = dict(zip(self.ids.tolist(), range(len(self))))
+        return self._positions[id]
+
+    def positions(self, ids) -> np.ndarray:
+        return np.fromiter((self.position(id) for id in np.atleast_1d(ids).tolist()), dtype=np.int64)
+
+    @staticmethod
+    def calculate_late_fees(deadlines: np.ndarray) -> np.ndarray:
+        deadlines = deadlines.astype(np.int32)
+        return np.where(deadlines < 0, deadlines ** 2, 0).astype(np.int32)
+
+    @classmethod
+    def from_packages(cls, packages: list[Package]) -> "PackageColumns":
+        return cls(
+            [package.id for package in packages],
+            [package.weight for package in packages],
+            [package.price_category for package in packages],
+            [package.deadline for package in packages],
+            [package.late_fee for package in packages]
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index: int) -> Package:
+        package = Package(int(self.ids[index]), float(self.weights[index]), int(self.price_categories[index]), int(self.deadlines[index]))
+        package.late_fee = int(self.late_fees[index])
+        return package
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def take(self, indices) -> "PackageColumns":
+        return PackageColumns(self.ids[indices], self.weights[indices], self.price_categories[indices], self.deadlines[indices], self.late_fees[indices])
+
+    def remove(self, indices):
+        removed = np.atleast_1d(np.asarray(indices, dtype=np.int64))
+        removed = np.unique(np.where(removed < 0, removed + len(self), removed))
+        if len(removed) == 0:
+            return
+
+        amt_remaining = len(self) - len(removed)
+        holes = removed[removed < amt_remaining]
+        kept_tail = np.ones(len(removed), dtype=bool)
+        kept_tail[removed[removed >= amt_remaining] - amt_remaining] = False
+        moved = np.flatnonzero(kept_tail) + amt_remaining
+
+        self.deadline_counts -= self.count_deadlines(self.deadlines[removed])
+        self.total_price_category -= int(self.price_categories[removed].sum())
+        self.total_late_fees -= int(self.late_fees[removed].sum())
+        if self._positions is not None:
+            for id in self.ids[removed].tolist():
+                del self._positions[id]
+            self._positions.update(zip(self.ids[moved].tolist(), holes.tolist()))
+
+        # copies only as many rows as are removed, the truncated columns stay views of the old ones
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            column[holes] = column[moved]
+            setattr(self, name, column[:amt_remaining])
+
+    def remove_ids(self, ids):
+        self.remove(self.positions(ids))
+
+    def pop(self, index: int) -> Package:
+        package = self[index]
+        self.remove(index)
+        return package
+
+    def extend(self, packages):
+        if not isinstance(packages, PackageColumns):
+            packages = PackageColumns.from_packages(packages)
+
+        if self._positions is not None:
+            self._positions.update(zip(packages.ids.tolist(), range(len(self), len(self) + len(packages))))
+        self.deadline_counts += packages.deadline_counts
+        self.total_price_category += packages.total_price_category
+        self.total_late_fees += packages.total_late_fees
+
+        for name in self.COLUMNS:
+            setattr(self, name, np.concatenate((getattr(self, name), getattr(packages, name))))
+
+    def advance_days(self, days: int = 1):
+        # every deadline moves closer at once and the late fees follow the new deadlines
+        self.deadlines -= days
+        self.late_fees = self.calculate_late_fees(self.deadlines)
+        self.deadline_counts = Counter({deadline - days: amount for deadline, amount in self.deadline_counts.items()})
+        self.total_late_fees = int(self.late_fees.sum())
+
+    def recalculate_fitness(self, min_deadline: int, max_deadline: int, indices=None, overdue_weight: float = Constants.OVERDUE_WEIGHT.value,
+                            deadline_weight: float = Constants.DEADLINE_WEIGHT.value, price_cat_weight: float = Constants.PRICE_CAT_WEIGHT.value) -> np.ndarray:
+        # vectorized Package.recalculate_fitness
+        price_categories = self.price_categories if indices is None else self.price_categories[indices]
+        deadlines = self.deadlines if indices is None else self.deadlines[indices]
+
+        normalized_price_categories = (price_categories / 10) * price_cat_weight
+        normalized_deadline_penalties = np.zeros(len(deadlines))
+
+        if min_deadline != 0:
+            overdue = deadlines < 0
+            normalized_deadline_penalties[overdue] = deadlines[overdue] / min_deadline * overdue_weight
+        if max_deadline != 0:
+            upcoming = deadlines > 0
+            normalized_deadline_penalties[upcoming] = (1 - deadlines[upcoming] / max_deadline) * deadline_weight
+
+        return normalized_price_categories + normalized_deadline_penalties
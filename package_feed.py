@@ -0,0 +1,65 @@
+import queue
+import threading
+import time
+
+from package import PackageColumns
+
+class PackageFeed:
+    # Reads package batches from any iterator, e.g. FileHandler.stream_package_columns, in a background thread.
+    # The planner drains whatever has arrived between generations, so reading never blocks the GA.
+    def __init__(self, batches):
+        self.batches = queue.Queue()
+        self.amt_packages = 0
+        self.amt_batches = 0
+        self.start = time.perf_counter()
+        self.last_arrival = None
+        self.error = None
+        self.finished = threading.Event()
+        self.closed = False
+        self.thread = threading.Thread(target=self.read, args=(iter(batches),), daemon=True)
+        self.thread.start()
+
+    def read(self, batches):
+        try:
+            for batch in batches:
+                if self.closed:
+                    break
+                self.batches.put(batch)
+                self.amt_packages += len(batch)
+                self.amt_batches += 1
+                self.last_arrival = time.perf_counter()
+        except Exception as error: # handed to the planner by the next drain
+            self.error = error
+        finally:
+            self.finished.set()
+
+    @property
+    def packages_per_second(self) -> float | None:
+        if self.last_arrival is None or self.last_arrival == self.start:
+            return None
+        return self.amt_packages / (self.last_arrival - self.start)
+
+    def drain(self) -> PackageColumns | None:
+        # every batch that has arrived since the last drain, as one PackageColumns
+        batches = []
+        while True:
+            try:
+                batches.append(self.batches.get_nowait())
+            except queue.Empty:
+                break
+        if self.error is not None and not batches:
+            error, self.error = self.error, None
+            raise error
+        if not batches:
+            return None
+
+        packages = batches[0]
+        for batch in batches[1:]:
+            packages.extend(batch)
+        return packages
+
+    def close(self):
+        self.closed = True
+
+    def stats(self) -> dict:
+        return {"packages": self.amt_packages, "batches": self.amt_batches, "packages_per_second": self.packages_per_second, "finished": self.finished.is_set()}
@@ -0,0 +1,63 @@
+from dataclasses import asdict, dataclass, fields, replace
+import json
+
+from constants import Constants
+
+@dataclass(frozen=True)
+class GAParameters:
+    # One profile of GA knobs and fitness weights. The defaults are the Constants; every ShippingCompany can run its own profile.
+    population_size: int = Constants.POPULATION_SIZE.value
+    generations: int = Constants.GENERATIONS.value
+    max_generations: int = Constants.MAX_GENERATIONS.value
+    amt_tournament_participants: int = Constants.AMT_TOURNAMENT_PARTICIPANTS.value
+    crossover_rate: float = Constants.CROSSOVER_RATE.value
+    crossover_operator: str = Constants.CROSSOVER_OPERATOR.value
+    mutation_rate: float = Constants.MUTATION_RATE.value
+    max_mutation_rate: float = Constants.MAX_MUTATION_RATE.value
+    fitness_delta_threshold: float = Constants.FITNESS_DELTA_THRESHOLD.value
+    elitism_participants: int = Constants.ELITISM_PARTICIPANTS.value
+    repair_children: bool = Constants.CHILD_REPAIR.value == "greedy"
+    greedy_seed_ratio: float = Constants.GREEDY_SEED_RATIO.value
+
+    # fitness weights
+    overdue_weight: float = Constants.OVERDUE_WEIGHT.value
+    deadline_weight: float = Constants.DEADLINE_WEIGHT.value
+    price_cat_weight: float = Constants.PRICE_CAT_WEIGHT.value
+    weight_weight: float = Constants.WEIGHT_WEIGHT.value
+
+    def __post_init__(self):
+        if self.population_size < 2:
+            raise ValueError(f"population_size must be at least 2, got {self.population_size}")
+        if not 0 <= self.elitism_participants < self.population_size:
+            raise ValueError(f"elitism_participants must be between 0 and population_size - 1, got {self.elitism_participants}")
+        if self.amt_tournament_participants < 1:
+            raise ValueError(f"amt_tournament_participants must be at least 1, got {self.amt_tournament_participants}")
+        for name in ("crossover_rate", "mutation_rate", "max_mutation_rate", "greedy_seed_ratio"):
+            if not 0 <= getattr(self, name) <= 1:
+                raise ValueError(f"{name} must be between 0 and 1, got {getattr(self, name)}")
+
+    def fitness_weights(self) -> dict:
+        # the keyword arguments of PackageColumns.recalculate_fitness
+        return {"overdue_weight": self.overdue_weight, "deadline_weight": self.deadline_weight, "price_cat_weight": self.price_cat_weight}
+
+    def replace(self, **changes) -> "GAParameters":
+        return replace(self, **changes)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, values: dict) -> "GAParameters":
+        unknown = values.keys() - {field.name for field in fields(cls)}
+        if unknown:
+            raise ValueError(f"Unknown GA parameters {sorted(unknown)}")
+        return cls(**values)
+
+    @classmethod
+    def load(cls, filepath: str) -> "GAParameters":
+        with open(filepath, "r", encoding='utf-8') as profile_file:
+            return cls.from_dict(json.load(profile_file))
+
+    def save(self, filepath: str):
+        with open(filepath, "w", encoding='utf-8') as profile_file:
+            json.dump(self.to_dict(), profile_file, indent=2)
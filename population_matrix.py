@@ -0,0 +1,314 @@
+import numpy as np
+
+from constants import Constants
+from fitness_cache import FitnessCache
+from knapsack import package_values
+from parameters import GAParameters
+from telemetry import Telemetry
+
+class PopulationMatrix:
+    def __init__(self, weights: np.ndarray, price_categories: np.ndarray, package_fitness: np.ndarray, genomes: np.ndarray, repair: bool = False, repair_order: np.ndarray = None,
+                 crossover_operator: str = Constants.CROSSOVER_OPERATOR.value, fitness_cache: FitnessCache = None,
+                 telemetry: Telemetry = None, parameters: GAParameters = None):
+        if crossover_operator not in CROSSOVER_OPERATORS:
+            raise ValueError(f"Unknown crossover operator {crossover_operator}, expected one of {tuple(CROSSOVER_OPERATORS)}")
+
+        self.weights = weights
+        self.price_categories = price_categories
+        self.package_fitness = package_fitness
+        self.genomes = genomes # boolean matrix, one row per solution and one column per package
+        self.amt_packages = len(weights)
+        self.repair = repair
+        self._repair_order = repair_order
+        self.crossover_operator = crossover_operator
+        self.fitness_cache = fitness_cache
+        self.telemetry = telemetry if telemetry is not None else Telemetry()
+        self.parameters = parameters if parameters is not None else GAParameters()
+
+        self.amt_children = 0
+        self.amt_repaired = 0
+        self.amt_evaluated = 0
+
+        # weight, price category and fitness contribution are summed in the same matrix product
+        self._columns = np.column_stack((weights, price_categories, package_fitness)).astype(np.float64)
+
+        self._total_weights = None
+        self._average_profit_categories = None
+        self._fitness = None
+
+    @property
+    def population_size(self) -> int:
+        return len(self.genomes)
+
+    @property
+    def repair_order(self) -> np.ndarray:
+        if self._repair_order is None:
+            self._repair_order = calculate_repair_order(self.weights, self.package_fitness, self.parameters.weight_weight)
+        return self._repair_order
+
+    @property
+    def total_weights(self) -> np.ndarray:
+        self.evaluate()
+        return self._total_weights
+
+    @property
+    def average_profit_categories(self) -> np.ndarray:
+        self.evaluate()
+        return self._average_profit_categories
+
+    @property
+    def fitness(self) -> np.ndarray:
+        self.evaluate()
+        return self._fitness
+
+    def evaluate(self):
+        if self._fitness is not None:
+            return
+
+        with self.telemetry.phase("evaluation"):
+            self._evaluate()
+
+    def _evaluate(self):
+        if self.fitness_cache is None:
+            evaluations = self.evaluate_genomes(self.genomes)
+            self.amt_evaluated = self.population_size
+        else:
+            # identical genomes (elites, children that skipped crossover and mutation) are only scored once per run
+            keys = self.fitness_cache.genome_keys(self.genomes)
+            cached_evaluations = [self.fitness_cache.get(key) for key in keys]
+            missing_rows = [row for row, evaluation in enumerate(cached_evaluations) if evaluation is None]
+
+            evaluations = np.empty((self.population_size, 3))
+            cached_rows = [row for row, evaluation in enumerate(cached_evaluations) if evaluation is not None]
+            if cached_rows:
+                evaluations[cached_rows] = [cached_evaluations[row] for row in cached_rows]
+            if missing_rows:
+                evaluations[missing_rows] = self.evaluate_genomes(self.genomes[missing_rows])
+                for row in missing_rows:
+                    self.fitness_cache.put(keys[row], evaluations[row].copy())
+            self.amt_evaluated = len(missing_rows)
+
+        self._total_weights, self._average_profit_categories, self._fitness = evaluations.T
+
+    def evaluate_genomes(self, genomes: np.ndarray) -> np.ndarray:
+        # one row per genome: total weight, average price category and fitness
+        totals = genomes.astype(np.float64) @ self._columns
+        amt_included = genomes.sum(axis=1)
+
+        total_weights = totals[:, 0].round(2) # weights are given in 0.1 kg, rounding drops float summation noise
+        average_profit_categories = np.divide(totals[:, 1], amt_included, out=np.zeros(len(genomes)), where=amt_included > 0)
+
+        normalized_total_weights = total_weights / Constants.WEIGHT_LIMIT.value * self.parameters.weight_weight
+        feasible = total_weights <= Constants.WEIGHT_LIMIT.value
+        fitness = np.where(feasible, totals[:, 2] + normalized_total_weights, 0.0)
+        return np.column_stack((total_weights, average_profit_categories, fitness))
+
+    def average_fitness(self) -> float:
+        return float(self.fitness.mean())
+
+    def feasible_ratio(self) -> float:
+        return float((self.total_weights <= Constants.WEIGHT_LIMIT.value).mean())
+
+    def best_index(self) -> int:
+        return int(np.argmax(self.fitness))
+
+    def worst_index(self) -> int:
+        return int(np.argmin(self.fitness))
+
+    def include_indices(self, row: int) -> list[int]:
+        return np.flatnonzero(self.genomes[row]).tolist()
+
+    @classmethod
+    def generate_random(cls, weights: np.ndarray, price_categories: np.ndarray, package_fitness: np.ndarray, population_size: int, rng: np.random.Generator,
+                        weight_limit: float = Constants.WEIGHT_LIMIT.value, repair: bool = False, crossover_operator: str = Constants.CROSSOVER_OPERATOR.value,
+                        fitness_cache: FitnessCache = None, telemetry: Telemetry = None, parameters: GAParameters = None):
+        return cls(weights, price_categories, package_fitness, generate_random_loads(weights, population_size, rng, weight_limit), repair,
+                   crossover_operator=crossover_operator, fitness_cache=fitness_cache, telemetry=telemetry, parameters=parameters)
+
+    def with_packages(self, weights: np.ndarray, price_categories: np.ndarray, package_fitness: np.ndarray) -> "PopulationMatrix":
+        # packages appended to the inventory join every genome unloaded, the rows keep their loads
+        genomes = np.zeros((self.population_size, len(weights)), dtype=bool)
+        genomes[:, :self.amt_packages] = self.genomes
+        return PopulationMatrix(weights, price_categories, package_fitness, genomes, self.repair, crossover_operator=self.crossover_operator,
+                                fitness_cache=self.fitness_cache, telemetry=self.telemetry, parameters=self.parameters)
+
+    def generate_next_generation(self, counter_avg_seen: int, rng: np.random.Generator):
+        population_size = self.population_size
+        telemetry = self.telemetry
+        parameters = self.parameters
+        with telemetry.phase("elitism"):
+            amt_elites = min(parameters.elitism_participants, population_size)
+            elite_genomes = self.genomes[np.argsort(self.fitness)[::-1][:amt_elites]]
+
+        amt_children = population_size - amt_elites
+        amt_pairs = (amt_children + 1) // 2
+        with telemetry.phase("selection"):
+            parents = select_tournament_winners(self.fitness, 2 * amt_pairs, parameters.amt_tournament_participants, rng)
+        with telemetry.phase("crossover"):
+            children = crossover_genomes(self.genomes[parents[:amt_pairs]], self.genomes[parents[amt_pairs:]], rng, self.crossover_operator,
+                                         parameters.crossover_rate)[:amt_children]
+
+        with telemetry.phase("mutation"):
+            mutation_rate = min(parameters.mutation_rate * counter_avg_seen, parameters.max_mutation_rate)
+            mutate_genomes(children, mutation_rate, rng)
+        if self.repair:
+            with telemetry.phase("repair"):
+                amt_repaired = repair_genomes(children, self.weights, self.repair_order)
+
+        next_genomes = np.concatenate((elite_genomes, children))
+        next_generation = PopulationMatrix(self.weights, self.price_categories, self.package_fitness, next_genomes, self.repair, self._repair_order,
+                                           self.crossover_operator, self.fitness_cache, telemetry, parameters)
+        next_generation.amt_children = amt_children
+        if self.repair:
+            next_generation.amt_repaired = amt_repaired
+        return next_generation
+
+
+def generate_random_loads(weights: np.ndarray, population_size: int, rng: np.random.Generator, weight_limit: float = Constants.WEIGHT_LIMIT.value) -> np.ndarray:
+    # Every row packs a shuffled inventory up to the weight limit, then keeps trying the following packages
+    # until ALLOWED_MISSES of them in a row don't fit. Rows are packed one at a time from a single reused permutation
+    # buffer, so memory stays at the genome matrix plus one permutation.
+    ALLOWED_MISSES = 100
+    CHUNK_SIZE = 256
+    amt_packages = len(weights)
+    genomes = np.zeros((population_size, amt_packages), dtype=bool)
+    permutation = np.arange(amt_packages)
+    for genome in genomes:
+        total_weight, position, misses = 0.0, 0, 0
+        while position < amt_packages and misses <= ALLOWED_MISSES:
+            # partial Fisher-Yates: only the packages about to be tried are drawn, a full shuffle per row costs O(packages)
+            stop = min(position + CHUNK_SIZE, amt_packages)
+            for index, swap in zip(range(position, stop), rng.integers(np.arange(position, stop), amt_packages).tolist()):
+                permutation[index], permutation[swap] = permutation[swap], permutation[index]
+            candidates = permutation[position:stop]
+            candidate_weights = weights[candidates]
+            position = stop
+
+            # the part of the chunk that fits as a whole goes in at once, the rest is tried one package at a time
+            cumulative_weights = total_weight + np.cumsum(candidate_weights)
+            amt_fitting = int(np.searchsorted(cumulative_weights, weight_limit, side="right"))
+            if amt_fitting > 0:
+                genome[candidates[:amt_fitting]] = True
+                total_weight, misses = float(cumulative_weights[amt_fitting - 1]), 0
+            for candidate, weight in zip(candidates[amt_fitting:].tolist(), candidate_weights[amt_fitting:].tolist()):
+                if misses > ALLOWED_MISSES:
+                    break
+                if total_weight + weight <= weight_limit:
+                    genome[candidate] = True
+                    total_weight, misses = total_weight + weight, 0
+                else:
+                    misses += 1
+
+    return genomes
+
+def select_tournament_winners(fitness: np.ndarray, amt_winners: int, tournament_size: int, rng: np.random.Generator) -> np.ndarray:
+    # every row of participants is one tournament, the fittest participant of each row wins
+    participants = rng.integers(len(fitness), size=(amt_winners, tournament_size))
+    return participants[np.arange(amt_winners), np.argmax(fitness[participants], axis=1)]
+
+# Crossover masks mark the genes a first child takes from its first parent, one row per pair of parents
+
+def single_point_crossover_mask(amt_pairs: int, amt_genes: int, rng: np.random.Generator) -> np.ndarray:
+    cut_points = rng.integers(1, max(amt_genes, 2), size=amt_pairs)
+    return np.arange(amt_genes) < cut_points[:, None]
+
+def two_point_crossover_mask(amt_pairs: int, amt_genes: int, rng: np.random.Generator) -> np.ndarray:
+    cut_points = np.sort(rng.integers(1, max(amt_genes, 2), size=(amt_pairs, 2)), axis=1)
+    genes = np.arange(amt_genes)
+    return (genes < cut_points[:, :1]) | (genes >= cut_points[:, 1:])
+
+def uniform_crossover_mask(amt_pairs: int, amt_genes: int, rng: np.random.Generator) -> np.ndarray:
+    return rng.random((amt_pairs, amt_genes)) < 0.5
+
+CROSSOVER_OPERATORS = {
+    "single_point": single_point_crossover_mask,
+    "two_point": two_point_crossover_mask,
+    "uniform": uniform_crossover_mask,
+}
+
+def crossover_genomes(parents1: np.ndarray, parents2: np.ndarray, rng: np.random.Generator, operator: str = Constants.CROSSOVER_OPERATOR.value,
+                      crossover_rate: float = Constants.CROSSOVER_RATE.value) -> np.ndarray:
+    # returns the first children of every pair followed by the second children, pairs that skip crossover copy their parents
+    amt_pairs, amt_genes = parents1.shape
+    from_first_parent = CROSSOVER_OPERATORS[operator](amt_pairs, amt_genes, rng)
+    from_first_parent[rng.random(amt_pairs) > crossover_rate] = True
+
+    children1 = np.where(from_first_parent, parents1, parents2)
+    children2 = np.where(from_first_parent, parents2, parents1)
+    return np.concatenate((children1, children2))
+
+def sample_mutation_positions(amt_genes: int, mutation_rate: float, rng: np.random.Generator) -> np.ndarray:
+    # Every gene flips with probability mutation_rate. The gaps between flipped genes are geometrically distributed,
+    # so drawing the gaps costs O(flipped genes) instead of one random number per gene.
+    if mutation_rate <= 0 or amt_genes == 0:
+        return np.empty(0, dtype=np.int64)
+    if mutation_rate >= 1:
+        return np.arange(amt_genes)
+
+    expected_flips = amt_genes * mutation_rate
+    batch_size = int(expected_flips + 4 * np.sqrt(expected_flips)) + 16
+    positions = np.cumsum(rng.geometric(mutation_rate, size=batch_size)) - 1
+    while positions[-1] < amt_genes:
+        positions = np.concatenate((positions, positions[-1] + np.cumsum(rng.geometric(mutation_rate, size=batch_size))))
+
+    return positions[:np.searchsorted(positions, amt_genes)]
+
+def mutate_genomes(genomes: np.ndarray, mutation_rate: float, rng: np.random.Generator):
+    # flips genes in place, genomes must be contiguous
+    genomes.reshape(-1)[sample_mutation_positions(genomes.size, mutation_rate, rng)] ^= True
+
+def remap_genomes(genomes: np.ndarray, old_ids: np.ndarray, new_ids: np.ndarray, fill_value=False) -> np.ndarray:
+    # Moves genome columns from an older inventory to the matching package ids of a newer one.
+    # Packages that are gone are dropped, new packages get fill_value.
+    order = np.argsort(old_ids, kind="stable")
+    positions = np.minimum(np.searchsorted(old_ids[order], new_ids), max(len(old_ids) - 1, 0))
+    found = old_ids[order][positions] == new_ids if len(old_ids) > 0 else np.zeros(len(new_ids), dtype=bool)
+
+    remapped_genomes = np.full((len(genomes), len(new_ids)), fill_value, dtype=genomes.dtype)
+    remapped_genomes[:, found] = genomes[:, order[positions[found]]]
+    return remapped_genomes
+
+def calculate_repair_order(weights: np.ndarray, package_fitness: np.ndarray, weight_weight: float = Constants.WEIGHT_WEIGHT.value) -> np.ndarray:
+    # package indices from lowest to highest value per kg
+    return np.argsort(package_values(weights, package_fitness, weight_weight) / np.maximum(weights, 1e-9), kind="stable")
+
+def repair_genomes(genomes: np.ndarray, weights: np.ndarray, repair_order: np.ndarray, weight_limit: float = Constants.WEIGHT_LIMIT.value) -> int:
+    # Drops the lowest value per kg packages of overweight rows until they fit, then fills every row's spare capacity
+    # with the best value per kg packages left out. Works in place and returns how many rows were overweight.
+    # Rows are repaired one at a time on their included packages and a chunk of fill candidates, so no temporary
+    # is as large as the population matrix.
+    ranks = np.empty(len(repair_order), dtype=np.int64)
+    ranks[repair_order] = np.arange(len(repair_order))
+    fill_order = repair_order[::-1]
+
+    amt_repaired = 0
+    for genome in genomes:
+        included = np.flatnonzero(genome)
+        included_weights = weights[included]
+        total_weight = float(included_weights.sum())
+
+        if round(total_weight, 2) > weight_limit:
+            amt_repaired += 1
+            order = np.argsort(ranks[included], kind="stable")
+            ordered_weights = included_weights[order]
+            weight_before = np.cumsum(ordered_weights) - ordered_weights
+            drop = weight_before < total_weight - weight_limit
+            genome[included[order[drop]]] = False
+            total_weight -= float(ordered_weights[drop].sum())
+
+        fill_capacity(genome, fill_order, weights, weight_limit - total_weight, False, True)
+
+    return amt_repaired
+
+def fill_capacity(genome: np.ndarray, fill_order: np.ndarray, weights: np.ndarray, spare_weight: float, left_out_value, fill_value, chunk_size: int = 4096):
+    # Sets the genes holding left_out_value to fill_value in fill order while the weight they add up to still fits, a prefix
+    # of the left out packages. The fill order is walked in chunks, so a nearly full load only looks at its first chunk.
+    weight_added = 0.0
+    for start in range(0, len(fill_order), chunk_size):
+        candidates = fill_order[start:start + chunk_size]
+        left_out = genome[candidates] == left_out_value
+        cumulative_weights = weight_added + np.cumsum(np.where(left_out, weights[candidates], 0.0))
+        genome[candidates[left_out & (cumulative_weights <= spare_weight)]] = fill_value
+        weight_added = float(cumulative_weights[-1])
+        if weight_added > spare_weight:
+            break
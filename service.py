@@ -0,0 +1,231 @@
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from filehandler import FileHandler
+from package import PackageColumns
+from shipping_company import ShippingCompany
+
+_planner_packages = None # inventory of the planning worker, handed over once when the worker starts
+_planner = None # ShippingCompany resident in the planning worker from its first plan on
+
+def initialize_planner(packages: PackageColumns):
+    global _planner_packages, _planner
+    _planner_packages, _planner = packages, None
+
+def plan_fleet(removed_ids: list[int], added: PackageColumns | None, engine: str, time_budget: float | None) -> dict:
+    # Runs in the planning worker on its resident inventory. Only the changes since the last plan travel in and only ids and
+    # reports travel back. The worker's inventory loses the packages it loads, like the service's.
+    global _planner
+    if _planner is None:
+        _planner_packages.remove_ids([id for id in removed_ids if has_package(_planner_packages, id)])
+        if added is not None:
+            _planner_packages.extend(added)
+        _planner = ShippingCompany(_planner_packages)
+    else:
+        present = [id for id in removed_ids if has_package(_planner.packages, id)]
+        if present:
+            _planner.remove_packages(_planner.packages.positions(present))
+        if added is not None:
+            _planner.add_packages(added)
+
+    shipping_company = _planner
+    shipping_company.engine, shipping_company.time_budget = engine, time_budget
+    shipping_company.reset_fleet()
+    start = time.perf_counter()
+    shipping_company.load_fleet()
+    return {
+        "seconds": time.perf_counter() - start,
+        "packages_remaining": shipping_company.amt_packages,
+        "loaded_ids": [truck.packages.ids.tolist() for truck in shipping_company.fleet],
+        "trucks": [truck.report() for truck in shipping_company.fleet],
+        "plans": shipping_company.planning_reports,
+    }
+
+def has_package(packages: PackageColumns, id: int) -> bool:
+    try:
+        packages.position(id)
+    except KeyError:
+        return False
+    return True
+
+class DispatchService:
+    # Keeps the inventory in memory and answers JSON line requests over a local socket. Planning runs in a worker
+    # process that keeps its own copy of the inventory and company, so stats, truck reports and package changes are
+    # answered while a plan is in progress and a plan only ships the package changes since the previous one.
+    COMMANDS = ("ping", "stats", "trucks", "add", "remove", "plan")
+
+    def __init__(self, packages: PackageColumns, engine: str = "matrix", time_budget: float = None):
+        self.packages = packages
+        self.engine = engine
+        self.time_budget = time_budget
+        self.executor = None
+        self.start_planner()
+        self.plan_lock = asyncio.Lock()
+        self.planning = False
+        self.last_plan = None
+        self.amt_plans = 0
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 0) -> asyncio.Server:
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+    def start_planner(self):
+        # a fresh worker starts from a full copy of the inventory, from then on it only gets the changes
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+        self.executor = ProcessPoolExecutor(max_workers=1, initializer=initialize_planner, initargs=(self.packages.take(np.arange(len(self.packages))),))
+        self.removed_since_plan = set()
+        self.added_since_plan = set()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # every request runs as its own task, so a slow plan does not hold up the queries behind it on the same connection
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                task = asyncio.create_task(self.respond(line, writer, write_lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+        finally:
+            writer.close()
+
+    async def respond(self, line: bytes, writer: asyncio.StreamWriter, write_lock: asyncio.Lock):
+        start = time.perf_counter()
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError(f"A request must be a JSON object, got {type(request).__name__}")
+            request_id = request.get("id")
+            result = await self.handle(request)
+            response = {"id": request_id, "ok": True, "result": result}
+        except Exception as error: # every request gets an answer, a failed plan included
+            response = {"id": request_id, "ok": False, "error": f"{type(error).__name__}: {error}"}
+        response["seconds"] = time.perf_counter() - start
+
+        async with write_lock:
+            writer.write((json.dumps(response) + "\n").encode("utf-8"))
+            await writer.drain()
+
+    async def handle(self, request: dict):
+        command = request["command"]
+        if command not in self.COMMANDS:
+            raise ValueError(f"Unknown command {command}, expected one of {self.COMMANDS}")
+
+        if command == "ping":
+            return "pong"
+        if command == "stats":
+            return self.stats()
+        if command == "trucks":
+            return self.last_plan["trucks"] if self.last_plan is not None else []
+        if command == "add":
+            return self.add_packages(request["packages"])
+        if command == "remove":
+            return self.remove_packages(request["ids"])
+        return await self.plan(request.get("engine", self.engine), request.get("time_budget", self.time_budget))
+
+    def stats(self) -> dict:
+        return {
+            "packages": len(self.packages),
+            "total_weight": round(float(self.packages.weights.sum()), 2),
+            "total_price_category": self.packages.total_price_category,
+            "total_late_fees": self.packages.total_late_fees,
+            "late_packages": self.packages.amt_late,
+            "min_deadline": self.packages.min_deadline,
+            "max_deadline": self.packages.max_deadline,
+            "deadline_counts": {str(deadline): amount for deadline, amount in sorted(self.packages.deadline_counts.items())},
+            "planning": self.planning,
+            "plans": self.amt_plans,
+        }
+
+    def add_packages(self, packages: list[dict]) -> dict:
+        ids = np.array([package["id"] for package in packages], dtype=np.int64)
+        known = [id for id in ids.tolist() if self.has_package(id)]
+        if known or len(np.unique(ids)) != len(ids):
+            raise ValueError(f"Duplicate package ids {known or ids.tolist()}")
+
+        self.packages.extend(PackageColumns(ids, [package["weight"] for package in packages], [package["price_category"] for package in packages],
+                                            [package["deadline"] for package in packages]))
+        self.added_since_plan.update(ids.tolist())
+        return {"added": len(ids), "packages": len(self.packages)}
+
+    def remove_packages(self, ids: list[int]) -> dict:
+        present = [id for id in ids if self.has_package(id)]
+        self.packages.remove_ids(present)
+        # the planning worker skips ids it does not have, like packages added and removed again between two plans
+        self.added_since_plan.difference_update(present)
+        self.removed_since_plan.update(present)
+        return {"removed": len(present), "missing": len(ids) - len(present), "packages": len(self.packages)}
+
+    def has_package(self, id: int) -> bool:
+        return has_package(self.packages, id)
+
+    async def plan(self, engine: str, time_budget: float | None) -> dict:
+        if engine not in ShippingCompany.ENGINES:
+            raise ValueError(f"Unknown engine {engine}, expected one of {ShippingCompany.ENGINES}")
+
+        async with self.plan_lock:
+            if len(self.packages) == 0:
+                raise ValueError("The inventory is empty")
+            self.planning = True
+            removed_ids, added_ids = sorted(self.removed_since_plan), sorted(self.added_since_plan)
+            added = self.packages.take(self.packages.positions(added_ids)) if added_ids else None
+            self.removed_since_plan, self.added_since_plan = set(), set()
+            try:
+                plan = await asyncio.get_running_loop().run_in_executor(self.executor, plan_fleet, removed_ids, added, engine, time_budget)
+            except BaseException as error:
+                # the worker's inventory may be half updated or the worker gone, the next plan starts a fresh one from a full copy
+                self.start_planner()
+                if isinstance(error, BrokenProcessPool):
+                    raise RuntimeError("The planning worker died, it has been restarted") from error
+                raise
+            finally:
+                self.planning = False
+
+            # packages removed while the plan ran are skipped, packages added meanwhile stay in the inventory
+            loaded_ids = [id for truck_ids in plan.pop("loaded_ids") for id in truck_ids]
+            present = [id for id in loaded_ids if self.has_package(id)]
+            self.packages.remove_ids(present)
+            plan["packages_loaded"] = len(present)
+            plan["loaded_ids_missing"] = len(loaded_ids) - len(present)
+            self.last_plan = plan
+            self.amt_plans += 1
+            return plan
+
+async def run(args):
+    filehandler = FileHandler()
+    packages = filehandler.create_package_columns_from_file(args.inventory)
+    service = DispatchService(packages, engine=args.engine, time_budget=args.time_budget)
+    server = await service.serve(args.host, args.port)
+    host, port = server.sockets[0].getsockname()[:2]
+    print(f"Serving {len(packages)} packages from {filehandler.last_load_source} on {host}:{port}", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+def parse_args(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Keep the inventory in memory and answer JSON line requests: "
+                                                 + ", ".join(DispatchService.COMMANDS) + ".")
+    parser.add_argument("--inventory", default=None, help="inventory csv, defaults to Constants.LAGERSTATUS_FILEPATH")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--engine", default="matrix", choices=ShippingCompany.ENGINES)
+    parser.add_argument("--time-budget", type=float, default=None, help="default seconds for planning a fleet, a plan request can override it")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(run(parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -1,121 +1,183 @@
-import copy
-from random import randint, uniform
-
 import numpy as np
 from collections import Counter
 
-import heapq
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from filehandler import FileHandler, Package
+from package import PackageColumns
 from delivery_truck import DeliveryTruck
 from constants import Constants
+from population_matrix import (CROSSOVER_OPERATORS, PopulationMatrix, calculate_repair_order, crossover_genomes, generate_random_loads, mutate_genomes,
+                               remap_genomes, repair_genomes, select_tournament_winners)
+from island_model import IslandModel
+from fleet_assignment import FleetAssignment, WAREHOUSE, generate_greedy_assignments, generate_random_assignments
+from fitness_cache import FitnessCache
+from telemetry import Telemetry
+from checkpoint import Checkpoint
+from package_feed import PackageFeed
+from knapsack import generate_greedy_loads, package_values, solve_knapsack_dp, solve_knapsack_greedy
+from parameters import GAParameters
 
 random_generator = np.random.default_rng()
 
 class Solution:
-    def __init__(self, packages: list[Package], max_deadline: int, min_deadline:int, include_indices: list[int] = None, weight_limit: float = Constants.WEIGHT_LIMIT.value):
-        self.packages = packages
+    def __init__(self, packages: PackageColumns | list[Package], max_deadline: int, min_deadline:int, include_indices: list[int] = None, weight_limit: float = Constants.WEIGHT_LIMIT.value, package_fitness: np.ndarray = None,
+                 weight_weight: float = Constants.WEIGHT_WEIGHT.value, sums: tuple[float, int, float] = None):
+        self.packages = packages if isinstance(packages, PackageColumns) else PackageColumns.from_packages(packages)
         self.amt_packages = len(self.packages)
         self.weight_limit = weight_limit
-
-        self.include_indices = include_indices if include_indices is not None else self.generate_random_solutions_limit_by_weight()
-        self.indices_dirty = True
+        self.weight_weight = weight_weight
 
         self.max_deadline = max_deadline
         self.min_deadline = min_deadline
 
-        self._total_weight = None
-        self._fitness = None
-        self._average_profit_category = None
+        # precomputed fitness contribution per package, see ShippingCompany.package_fitness
+        self.package_fitness = package_fitness if package_fitness is not None else self.packages.recalculate_fitness(min_deadline, max_deadline)
+
+        self.set_include_indices(include_indices if include_indices is not None else self.generate_random_solutions_limit_by_weight(), sums)
 
     @property
     def count_deadline(self):
-        return Counter([self.packages[index].deadline for index in self.include_indices])
+        return Counter(self.packages.deadlines[self.include_indices].tolist())
 
     @property
     def total_weight(self):
-        self.recalculate()
-        return self._total_weight
+        return round(self._sum_weight, 2) # weights are given in 0.1 kg, rounding drops float summation noise
 
     @property
     def average_profit_category(self):
-        self.recalculate()
-        return self._average_profit_category
+        return self._sum_price_category / len(self.include_indices)
 
     @property
     def average_deadline(self):
-        summed_deadline = sum([self.packages[index].deadline for index in self.include_indices])
+        summed_deadline = int(self.packages.deadlines[self.include_indices].sum())
         return summed_deadline / len(self.include_indices)
 
     @property
     def fitness(self):
-        self.recalculate()
-        return self._fitness
+        total_weight = self.total_weight
+        normalized_total_weight = total_weight / Constants.WEIGHT_LIMIT.value * self.weight_weight
 
-    def append_index(self, index: int):
-        self.include_indices.append(index)
-        self.indices_dirty = True
+        return self._sum_packages_fitness + normalized_total_weight if total_weight <= Constants.WEIGHT_LIMIT.value else 0
 
-    def remove_index(self, index: int):
-        self.include_indices.remove(index)
-        self.indices_dirty = True
+    def includes(self, index: int) -> bool:
+        return index in self._positions
 
-    def recalculate(self):
-        if not self.indices_dirty:
-            return
+    def copy(self) -> "Solution":
+        # packages and package_fitness are shared between solutions; the genome is only copied once either side changes it
+        solution_copy = Solution.__new__(Solution)
+        solution_copy.__dict__.update(self.__dict__)
+        self._owns_indices = False
+        solution_copy._owns_indices = False
+        return solution_copy
+
+    def __deepcopy__(self, memo):
+        return self.copy()
 
-        self.indices_dirty = False
+    def _own_indices(self):
+        if not self._owns_indices:
+            self.include_indices = list(self.include_indices)
+            self._positions = dict(self._positions)
+            self._owns_indices = True
+
+    @property
+    def sums(self) -> tuple[float, int, float]:
+        # weight, price category and package fitness summed over the included packages
+        return self._sum_weight, self._sum_price_category, self._sum_packages_fitness
 
-        weight = 0
-        for index in self.include_indices:
-            package = self.packages[index]
-            weight += package.weight
-        self._total_weight = weight
+    def set_include_indices(self, include_indices: list[int], sums: tuple[float, int, float] = None):
+        self.include_indices = include_indices
+        self._positions = {index: position for position, index in enumerate(include_indices)} # package index -> position in include_indices
+        self._owns_indices = True
+        if sums is None:
+            self.recalculate()
+        else:
+            self._sum_weight, self._sum_price_category, self._sum_packages_fitness = sums
 
-        sum_price_cat = 0
-        for index in self.include_indices:
-            package = self.packages[index]
-            sum_price_cat += package.price_category
+    # running sums are updated per changed gene, so a mutation costs O(changed genes) rather than O(genome)
 
-        self._average_profit_category = sum_price_cat / len(self.include_indices)
+    def append_index(self, index: int):
+        if index in self._positions:
+            return
 
-        total_weight = 0
-        sum_packages_fitness = 0
+        self._own_indices()
+        self._positions[index] = len(self.include_indices)
+        self.include_indices.append(index)
 
-        for index in self.include_indices:
-            package = self.packages[index]
-            total_weight += package.weight
-            sum_packages_fitness += package.recalculate_fitness(self.min_deadline, self.max_deadline)
+        self._sum_weight += float(self.packages.weights[index])
+        self._sum_price_category += int(self.packages.price_categories[index])
+        self._sum_packages_fitness += float(self.package_fitness[index])
 
-        normalized_total_weight = total_weight / Constants.WEIGHT_LIMIT.value * Constants.WEIGHT_WEIGHT.value
+    def remove_index(self, index: int):
+        if index not in self._positions:
+            raise ValueError(f"Package index {index} is not included in the solution")
 
-        self._fitness = sum_packages_fitness + normalized_total_weight if total_weight <= Constants.WEIGHT_LIMIT.value else 0
+        self._own_indices()
+        position = self._positions.pop(index)
+        last_index = self.include_indices.pop()
+        if last_index != index: # swap the last index into the freed position
+            self.include_indices[position] = last_index
+            self._positions[last_index] = position
+
+        self._sum_weight -= float(self.packages.weights[index])
+        self._sum_price_category -= int(self.packages.price_categories[index])
+        self._sum_packages_fitness -= float(self.package_fitness[index])
+
+    def recalculate(self):
+        self._sum_weight = float(self.packages.weights[self.include_indices].sum())
+        self._sum_price_category = int(self.packages.price_categories[self.include_indices].sum())
+        self._sum_packages_fitness = float(self.package_fitness[self.include_indices].sum())
 
     def generate_random_solutions_limit_by_weight(self) -> list[int]:
-        ALLOWED_MISSES = 100
-        total_weight = 0
-        seen_indices = []
-        amt_seen_indices = 0
-        miss = 0
-        while amt_seen_indices < self.amt_packages: # Only run when there are still packages to include
-            rand_index = randint(0, self.amt_packages - 1)
-            if rand_index not in seen_indices:
-                package = self.packages[rand_index]
-                if total_weight + package.weight > self.weight_limit:
-                    miss += 1
-                    if miss > ALLOWED_MISSES: break
-                else:
-                    total_weight += package.weight
-                    seen_indices.append(rand_index)
-                    amt_seen_indices += 1
-                    miss = 0
-        return seen_indices
+        return np.flatnonzero(generate_random_loads(self.packages.weights, 1, random_generator, self.weight_limit)[0]).tolist()
 
 class ShippingCompany:
-    def __init__(self, packages: list[Package] = None):
+    ENGINES = ("solution", "matrix", "island", "fleet", "dp", "greedy")
+
+    def __init__(self, packages: PackageColumns | list[Package] = None, engine: str = "solution", greedy_seed_ratio: float = None,
+                 repair_children: bool = None, crossover_operator: str = None,
+                 fitness_cache_size: int = Constants.FITNESS_CACHE_SIZE.value, telemetry: Telemetry = None, warm_start: bool = False,
+                 checkpoint_dir: str = None, checkpoint_interval: int = Constants.CHECKPOINT_INTERVAL.value, resume: bool = False,
+                 time_budget: float = None, package_feed: PackageFeed = None, parameters: GAParameters = None):
+        # greedy_seed_ratio, repair_children and crossover_operator override the parameter profile when given
+        overrides = {"greedy_seed_ratio": greedy_seed_ratio, "repair_children": repair_children, "crossover_operator": crossover_operator}
+        parameters = (parameters if parameters is not None else GAParameters()).replace(**{key: value for key, value in overrides.items() if value is not None})
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine {engine}, expected one of {self.ENGINES}")
+        if parameters.crossover_operator not in CROSSOVER_OPERATORS:
+            raise ValueError(f"Unknown crossover operator {parameters.crossover_operator}, expected one of {tuple(CROSSOVER_OPERATORS)}")
+        if engine == "island" and (warm_start or checkpoint_dir is not None or resume):
+            raise ValueError("The island engine supports neither warm starts nor checkpoints")
+
+        self.engine = engine
+        self.parameters = parameters # GA knobs and fitness weights of this instance, see GAParameters
+        self.repair_stats = Counter()
+        self.fitness_cache = FitnessCache(fitness_cache_size) # only valid for the current inventory, cleared by every genetic_algorithm run
+        self.generation_history = [] # (perf_counter timestamp, best fitness) per generation of the last run
+        self.telemetry = telemetry if telemetry is not None else Telemetry() # quiet unless given a sink
+        self.warm_start = warm_start
+        self.surviving_populations = {} # truck id or "fleet" -> (package ids, genomes) of the last population planned for it
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_interval = checkpoint_interval
+        self.resume = resume
+        self.time_budget = time_budget # seconds for planning the whole fleet in load_fleet, None plans every truck until convergence
+        self.planning_deadline = None # perf_counter timestamp at which the running GA returns its best solution so far
+        self.island_executor = None # process pool shared by the islands of every truck during load_fleet
+        self.last_run = None
+        self.planning_reports = [] # fitness, time and stop reason of every plan made by the last load_fleet
+        self.package_feed = package_feed # packages arriving while planning, taken in between trucks and between generations
+        # changes to the inventory since the last save_stock_status
+        self.removed_since_save = set()
+        self.added_since_save = set()
+        self.days_since_save = 0
         self.filehandler = FileHandler()
-        self.packages = packages or self.filehandler.create_packages_from_file()
+        packages = packages or self.filehandler.create_package_columns_from_file()
+        self.packages = packages if isinstance(packages, PackageColumns) else PackageColumns.from_packages(packages)
         self.fleet = [DeliveryTruck(id) for id in range(Constants.AMT_TRUCKS.value)]
-        self.initial_late_fees = self.calculate_late_fees(self.packages)
+        self.initial_late_fees = int(self.packages.late_fees.sum())
+        self._package_fitness = None
+        self._repair_order = None
 
     def calculate_late_fees(self, packages: list[Package]):
         return sum([package.late_fee for package in packages])
@@ -123,17 +185,17 @@ class ShippingCompany:
     def calculate_late_fees_fleet(self):
         total_late_fees = 0
         for truck in self.fleet:
-            total_late_fees += self.calculate_late_fees(truck.packages)
+            total_late_fees += truck.total_late_fees()
         return total_late_fees
 
     def calculate_profit_fleet(self):
         total_profit = 0
         for truck in self.fleet:
-            total_profit += self.sum_price_category(truck.packages)
+            total_profit += truck.total_price()
         return total_profit
 
     def calculate_sum_price_inventory(self):
-        return self.sum_price_category(self.packages)
+        return self.packages.total_price_category
 
     def sum_price_category(self, packages: list[Package]):
         return sum([package.price_category for package in packages])
@@ -142,128 +204,572 @@ class ShippingCompany:
     def amt_packages(self) -> int:
         return len(self.packages)
 
+    @property
+    def greedy_seed_ratio(self) -> float:
+        return self.parameters.greedy_seed_ratio
+
+    @property
+    def repair_children(self) -> bool:
+        return self.parameters.repair_children
+
+    @property
+    def crossover_operator(self) -> str:
+        return self.parameters.crossover_operator
+
+    @property
+    def package_fitness(self) -> np.ndarray:
+        if self._package_fitness is None:
+            self._package_fitness = self.packages.recalculate_fitness(self.min_deadline, self.max_deadline, **self.parameters.fitness_weights())
+        return self._package_fitness
+
+    @property
+    def repair_order(self) -> np.ndarray:
+        if self._repair_order is None:
+            self._repair_order = calculate_repair_order(self.packages.weights, self.package_fitness, self.parameters.weight_weight)
+        return self._repair_order
+
+    def invalidate_package_fitness(self):
+        # Fitness is normalized by the inventory's deadline range, so any change to the inventory invalidates every entry
+        self._package_fitness = None
+        self._repair_order = None
+
+    def add_packages(self, packages: PackageColumns | list[Package]):
+        # as long as the deadline range stays the same, only the new packages' fitness has to be calculated
+        amt_packages, deadline_range = self.amt_packages, (self.min_deadline, self.max_deadline)
+        self.packages.extend(packages)
+        self.added_since_save.update(self.packages.ids[amt_packages:].tolist())
+        if self._package_fitness is None or amt_packages == 0 or (self.min_deadline, self.max_deadline) != deadline_range:
+            self.invalidate_package_fitness()
+            return
+
+        new_fitness = self.packages.recalculate_fitness(*deadline_range, indices=np.arange(amt_packages, self.amt_packages), **self.parameters.fitness_weights())
+        self._package_fitness = np.concatenate((self._package_fitness, new_fitness))
+        self._repair_order = None
+
+    def remove_packages(self, indices):
+        ids = set(self.packages.ids[indices].tolist())
+        never_saved = ids & self.added_since_save
+        self.added_since_save -= never_saved
+        self.removed_since_save |= ids - never_saved
+        self.packages.remove(indices)
+        self.invalidate_package_fitness()
+
+    def save_stock_status(self, filepath: str = None):
+        # writes only what changed since the last save, see FileHandler.append_stock_changes
+        added_ids = sorted(self.added_since_save)
+        added = self.packages.take(self.packages.positions(added_ids)) if added_ids else None
+        self.filehandler.append_stock_changes(filepath, sorted(self.removed_since_save), added, self.days_since_save)
+        self.removed_since_save.clear()
+        self.added_since_save.clear()
+        self.days_since_save = 0
+
+    def absorb_package_feed(self) -> int:
+        if self.package_feed is None:
+            return 0
+        packages = self.package_feed.drain()
+        if packages is None:
+            return 0
+
+        start = time.perf_counter()
+        self.add_packages(packages)
+        self.fitness_cache.clear() # cached fitness belongs to the old deadline range and genome length
+        if self.telemetry.enabled:
+            self.telemetry.record("ingest", packages=len(packages), inventory=self.amt_packages, seconds=time.perf_counter() - start,
+                                  **{f"feed_{key}": value for key, value in self.package_feed.stats().items()})
+        return len(packages)
+
+    def extend_population(self, population: PopulationMatrix | FleetAssignment) -> PopulationMatrix | FleetAssignment:
+        if isinstance(population, FleetAssignment):
+            return population.with_packages(self.packages.weights, self.package_fitness)
+        return population.with_packages(self.packages.weights, self.packages.price_categories, self.package_fitness)
+
     @property
     def max_deadline(self):
-        return max(self.packages, key=lambda package: package.deadline).deadline
+        return self.packages.max_deadline
 
     @property
     def min_deadline(self):
-        return min(self.packages, key=lambda package: package.deadline).deadline
+        return self.packages.min_deadline
 
     def load_fleet(self):
-        for truck in self.fleet:
-            if self.packages:
-                print(f"Truck {truck.id}")
-                best_solution = self.genetic_algorithm()
-                sorted_reversed_indices = sorted(best_solution.include_indices, reverse=True)
-                for index in sorted_reversed_indices:
-                    package = self.packages.pop(index)
-                    truck.load_package(package)
-            print(f"Truck weight: {truck.weight}")
-
-    def genetic_algorithm(self) -> Solution:
-        current_generation = self.generate_random_solutions()
-        generation = 0
-        current_generation_avg = self.calculate_average_fitness(current_generation)
-        current_best = max(current_generation, key=lambda x: x.fitness)
-        worst = min(current_generation, key=lambda x: x.fitness)
-        print(f"Generation {generation} fitness average: {current_generation_avg:.2f}, best: {current_best.fitness:.2f}, worst: {worst.fitness:.2f}")
-
-        counter_avg_seen = 0
-        while counter_avg_seen < Constants.GENERATIONS.value and generation < Constants.MAX_GENERATIONS.value:
+        self.planning_reports.clear()
+        start = time.perf_counter()
+        try:
+            if self.engine == "fleet":
+                self.planning_deadline = self.slice_deadline(start, 1)
+                self.absorb_package_feed()
+                return self.load_fleet_jointly()
+            if self.engine == "island":
+                self.island_executor = ProcessPoolExecutor(max_workers=Constants.AMT_ISLANDS.value)
+
+            for position, truck in enumerate(self.fleet):
+                self.absorb_package_feed()
+                if self.amt_packages > 0:
+                    self.planning_deadline = self.slice_deadline(start, len(self.fleet) - position)
+                    slice_start = time.perf_counter()
+                    best_solution = self.plan_truck(truck)
+                    self.record_plan(truck.id, slice_start, best_solution.fitness)
+                    truck.load_packages(self.packages.take(best_solution.include_indices))
+                    self.remove_packages(best_solution.include_indices)
+                self.telemetry.record("truck", truck=truck.id, weight=truck.weight, packages=len(truck.packages))
+        finally:
+            self.planning_deadline = None
+            if self.island_executor is not None:
+                self.island_executor.shutdown()
+                self.island_executor = None
+
+    def slice_deadline(self, start: float, amt_plans_left: int) -> float | None:
+        # the budget left is shared evenly by the plans still to make, so time a converged GA leaves over goes to the next trucks
+        if self.time_budget is None:
+            return None
+        now = time.perf_counter()
+        return now + max(start + self.time_budget - now, 0) / amt_plans_left
+
+    def out_of_time(self) -> bool:
+        return self.planning_deadline is not None and time.perf_counter() >= self.planning_deadline
+
+    def record_plan(self, population_key, start: float, fitness: float):
+        now = time.perf_counter()
+        plan = {
+            "population": population_key,
+            "budget_seconds": self.planning_deadline - start if self.planning_deadline is not None else None,
+            "seconds": now - start,
+            "fitness": float(fitness),
+            **(self.last_run or {"generations": None, "stopped": "solved"}),
+        }
+        self.planning_reports.append(plan)
+        self.telemetry.record("plan", engine=self.engine, **plan)
+
+    def plan_truck(self, truck: DeliveryTruck) -> Solution:
+        self.last_run = None
+        if self.engine == "dp":
+            return self.knapsack_solution(solve_knapsack_dp, truck.max_weight - truck.weight)
+        if self.engine == "greedy":
+            return self.knapsack_solution(solve_knapsack_greedy, truck.max_weight - truck.weight)
+        return self.genetic_algorithm(truck.id)
+
+    def knapsack_solution(self, solver, capacity: float) -> Solution:
+        self.telemetry.start_run()
+        start = time.perf_counter()
+        package_fitness = self.package_fitness
+        include_indices = solver(self.packages.weights, package_values(self.packages.weights, package_fitness, self.parameters.weight_weight), capacity)
+
+        best_solution = Solution(self.packages, self.max_deadline, self.min_deadline, include_indices=include_indices.tolist(), package_fitness=package_fitness,
+                                 weight_weight=self.parameters.weight_weight)
+        self.record_solution(best_solution, seconds=time.perf_counter() - start)
+        return best_solution
+
+    def record_solution(self, solution: Solution, **fields):
+        if self.telemetry.enabled:
+            self.telemetry.record("solution", engine=self.engine, fitness=solution.fitness, weight=solution.total_weight, packages=len(solution.include_indices),
+                                  average_profit_category=solution.average_profit_category, average_deadline=solution.average_deadline,
+                                  deadline_distribution={str(deadline): amount for deadline, amount in sorted(solution.count_deadline.items())}, **fields)
+
+    def record_run(self, start: float, generations: int):
+        if self.out_of_time():
+            stopped = "time_budget"
+        elif generations >= self.parameters.max_generations:
+            stopped = "max_generations"
+        else:
+            stopped = "converged"
+        self.last_run = {"generations": generations, "stopped": stopped}
+        if self.telemetry.enabled:
+            self.telemetry.record_phases()
+            self.telemetry.record("run", engine=self.engine, generations=generations, seconds=time.perf_counter() - start, children=self.repair_stats["children"],
+                                  repaired=self.repair_stats["repaired"], **{f"fitness_cache_{key}": value for key, value in self.fitness_cache.stats().items()})
+
+    def genetic_algorithm(self, population_key: int = None) -> Solution:
+        # population_key names the population for warm starts, plan_truck uses the truck id
+        self.repair_stats.clear()
+        self.fitness_cache.clear()
+        self.generation_history.clear()
+        self.telemetry.start_run()
+        if self.engine == "matrix":
+            return self.genetic_algorithm_matrix(population_key)
+        if self.engine == "island":
+            return self.genetic_algorithm_islands()
+
+        start = time.perf_counter()
+        generation, counter_avg_seen = 0, 0
+        checkpoint = self.resume_checkpoint(population_key)
+        with self.telemetry.phase("initialization"):
+            if checkpoint is not None:
+                current_generation = self.solutions_from_genomes(checkpoint.genomes)
+                generation, counter_avg_seen = checkpoint.generation, checkpoint.counter_avg_seen
+            else:
+                current_generation = self.generate_random_solutions(population_key=population_key)
+        current_best_fitness = self.record_solutions_generation(generation, current_generation, self.fitness_cache.misses)
+        if checkpoint is not None:
+            current_best_fitness = checkpoint.best_fitness
+
+        while counter_avg_seen < self.parameters.generations and generation < self.parameters.max_generations and not self.out_of_time():
             generation += 1
+            if self.absorb_package_feed():
+                # arrivals are appended, so the genomes only widen and every solution is scored again on the new deadline range
+                current_generation = self.solutions_from_genomes(self.solution_genomes(current_generation))
+                current_best_fitness, counter_avg_seen = max(solution.fitness for solution in current_generation), 0
 
+            misses = self.fitness_cache.misses
             next_generation = self.generate_next_generation(current_generation, counter_avg_seen)
-            next_generation_avg = self.calculate_average_fitness(next_generation)
-            next_best = max(current_generation, key=lambda x: x.fitness)
-            worst = min(current_generation, key=lambda x: x.fitness)
-            print(f"Generation {generation} average fitness: {next_generation_avg:.2f}, best: {next_best.fitness:.2f}, worst: {worst.fitness:.2f}")
+            next_best_fitness = self.record_solutions_generation(generation, next_generation, self.fitness_cache.misses - misses)
 
-            if abs(current_best.fitness - next_best.fitness) <= Constants.FITNESS_DELTA_THRESHOLD.value:
+            if abs(current_best_fitness - next_best_fitness) <= self.parameters.fitness_delta_threshold:
                 counter_avg_seen += 1
             else:
                 counter_avg_seen = 0
 
             current_generation = next_generation
-            current_best = next_best
-
+            current_best_fitness = next_best_fitness
+            if self.checkpoint_due(generation):
+                self.save_checkpoint(population_key, self.solution_genomes(current_generation), generation, counter_avg_seen, current_best_fitness)
+
+        self.record_run(start, generation)
+        if self.checkpoint_dir is not None:
+            self.save_checkpoint(population_key, self.solution_genomes(current_generation), generation, counter_avg_seen, current_best_fitness, finished=True)
+        self.store_surviving_population(population_key, lambda: self.solution_genomes(current_generation))
         best_solution = max(current_generation, key=lambda x: x.fitness)
-        print(f"best fitness: {best_solution.fitness:.2f}, weight: {best_solution.total_weight:.2f}, avg price category: {best_solution.average_profit_category:.2f}, avg deadline: {best_solution.average_deadline:.2f}")
-        print(f"package deadline distribution: {best_solution.count_deadline}")
+        self.record_solution(best_solution)
         return best_solution
 
-    def generate_next_generation(self, old_generation: list[Solution], counter_avg_seen: int):
-        new_population = []
-        elite_solutions = heapq.nlargest(Constants.ELITISM_PARTICIPANTS.value, old_generation, key=lambda x: x.fitness)
-        new_population += [copy.deepcopy(solution) for solution in elite_solutions]
-
-        while len(new_population) < Constants.POPULATION_SIZE.value:
-            two_parents = self.select_tournament_winner_parents(old_generation, Constants.AMT_TOURNAMENT_PARTICIPANTS.value)
-            child1, child2 = self.produce_two_children(two_parents)
-
-            new_population.append(self.mutate_solution(child1, counter_avg_seen))
-            new_population.append(self.mutate_solution(child2, counter_avg_seen))
-
-        return new_population
-
-    def calculate_average_fitness(self, population: list[Solution]):
-        return sum([solution.fitness for solution in population]) / len(population)
-
-    def generate_random_solutions(self, population_size: int = Constants.POPULATION_SIZE.value) -> list[Solution]:
-        return [Solution(self.packages, self.max_deadline, self.min_deadline) for _ in range(population_size)]
-
-    def select_tournament_winner_parents(self, population: list[Solution], tournament_size: int):
-        parents = []
-        for _ in range(2):
-            participants = random_generator.choice(population, size = tournament_size)
-            parent = max(participants, key=lambda x: x.fitness)
-            parents.append(parent)
-        return parents
-
-    def produce_two_children(self, parents: list[Solution], crossover_rate: float = Constants.CROSSOVER_RATE.value) -> tuple[Solution, Solution]:
-        parent1, parent2 = parents
+    def record_solutions_generation(self, generation: int, population: list[Solution], evaluations: int) -> float:
+        fitness = np.array([solution.fitness for solution in population])
+        self.generation_history.append((time.perf_counter(), float(fitness.max())))
+        if self.telemetry.enabled:
+            feasible_ratio = np.mean([solution.total_weight <= Constants.WEIGHT_LIMIT.value for solution in population])
+            self.telemetry.record_generation(generation, fitness, feasible_ratio, evaluations, engine=self.engine)
+        return float(fitness.max())
+
+    def genetic_algorithm_matrix(self, population_key: int = None) -> Solution:
+        start = time.perf_counter()
+        package_fitness = self.package_fitness
+        checkpoint = self.resume_checkpoint(population_key)
+        with self.telemetry.phase("initialization"):
+            genomes = checkpoint.genomes if checkpoint is not None else self.generate_initial_genomes(population_key=population_key)
+            first_generation = PopulationMatrix(self.packages.weights, self.packages.price_categories, package_fitness, genomes, self.repair_children,
+                                               crossover_operator=self.crossover_operator, fitness_cache=self.fitness_cache, telemetry=self.telemetry,
+                                               parameters=self.parameters)
+        last_generation, generations = self.evolve_population(first_generation, population_key=population_key, checkpoint=checkpoint)
+        self.record_run(start, generations)
+        self.store_surviving_population(population_key, lambda: last_generation.genomes)
+
+        best_solution = Solution(self.packages, self.max_deadline, self.min_deadline, include_indices=last_generation.include_indices(last_generation.best_index()), package_fitness=last_generation.package_fitness,
+                                 weight_weight=self.parameters.weight_weight)
+        self.record_solution(best_solution)
+        return best_solution
 
-        if not random_generator.random() <= crossover_rate:
-            return parent1, parent2
+    def evolve_population(self, current_generation: PopulationMatrix | FleetAssignment, fitness_delta_threshold: float = None,
+                          population_key=None, checkpoint: Checkpoint = None) -> tuple[PopulationMatrix | FleetAssignment, int]:
+        if fitness_delta_threshold is None:
+            fitness_delta_threshold = self.parameters.fitness_delta_threshold
+        # a checkpoint taken on the current inventory continues from its generation and convergence counter
+        generation, counter_avg_seen = (checkpoint.generation, checkpoint.counter_avg_seen) if checkpoint is not None else (0, 0)
+        current_best_fitness = self.record_population_generation(generation, current_generation)
+        if checkpoint is not None:
+            current_best_fitness = checkpoint.best_fitness
+
+        while counter_avg_seen < self.parameters.generations and generation < self.parameters.max_generations and not self.out_of_time():
+            generation += 1
+            if self.absorb_package_feed():
+                # the population grows with the inventory instead of starting over, convergence is judged afresh
+                current_generation = self.extend_population(current_generation)
+                current_best_fitness, counter_avg_seen = float(current_generation.fitness.max()), 0
 
-        parent1_half_1, parent1_half_2 = self.splice_parent(parent1)
-        parent2_half_1, parent2_half_2 = self.splice_parent(parent2)
+            next_generation = current_generation.generate_next_generation(counter_avg_seen, random_generator)
+            self.repair_stats["children"] += next_generation.amt_children
+            self.repair_stats["repaired"] += next_generation.amt_repaired
+            next_best_fitness = self.record_population_generation(generation, next_generation)
 
-        child1 = Solution(self.packages, self.max_deadline, self.min_deadline, include_indices=parent1_half_1 + parent2_half_2)
-        child2 = Solution(self.packages, self.max_deadline, self.min_deadline, include_indices=parent2_half_1 + parent1_half_2)
+            if abs(current_best_fitness - next_best_fitness) <= fitness_delta_threshold:
+                counter_avg_seen += 1
+            else:
+                counter_avg_seen = 0
 
-        return child1, child2
+            current_generation = next_generation
+            current_best_fitness = next_best_fitness
+            if self.checkpoint_due(generation):
+                self.save_checkpoint(population_key, current_generation.genomes, generation, counter_avg_seen, current_best_fitness)
+
+        if self.checkpoint_dir is not None:
+            self.save_checkpoint(population_key, current_generation.genomes, generation, counter_avg_seen, current_best_fitness, finished=True)
+        return current_generation, generation
+
+    def record_population_generation(self, generation: int, population: PopulationMatrix | FleetAssignment) -> float:
+        best_fitness = float(population.fitness[population.best_index()])
+        self.generation_history.append((time.perf_counter(), best_fitness))
+        self.telemetry.record_generation(generation, population.fitness, population.feasible_ratio(), population.amt_evaluated, engine=self.engine)
+        return best_fitness
+
+    def load_fleet_jointly(self):
+        if self.amt_packages == 0:
+            return
 
-    def splice_parent(self, parent: Solution) -> tuple[list[int], list[int]]:
-        half_1 = []
-        half_2 = []
-        middle_index = self.amt_packages // 2
-        for index in parent.include_indices:
-            if index < middle_index:
-                half_1.append(index)
+        self.repair_stats.clear()
+        self.generation_history.clear()
+        self.telemetry.start_run()
+        start = time.perf_counter()
+        capacities = np.array([truck.max_weight - truck.weight for truck in self.fleet], dtype=np.float64)
+        checkpoint = self.resume_checkpoint("fleet")
+        with self.telemetry.phase("initialization"):
+            if checkpoint is not None:
+                first_generation = FleetAssignment(self.packages.weights, self.package_fitness, capacities, checkpoint.genomes, self.crossover_operator, self.telemetry,
+                                                   self.parameters)
             else:
-                half_2.append(index)
-        return half_1, half_2
-
-    def mutate_solution(self, solution: Solution, counter_avg_seen):
-        solution_copy = copy.deepcopy(solution)
+                first_generation = FleetAssignment(self.packages.weights, self.package_fitness, capacities, self.generate_initial_assignments(capacities, "fleet"),
+                                                   self.crossover_operator, self.telemetry, self.parameters)
+        # the fleet fitness sums one truck score per truck, so the convergence threshold scales with the fleet
+        last_generation, generations = self.evolve_population(first_generation, self.parameters.fitness_delta_threshold * len(self.fleet), "fleet", checkpoint)
+        self.record_run(start, generations)
+        self.store_surviving_population("fleet", lambda: last_generation.genomes)
+
+        best_row = last_generation.best_index()
+        best_assignment = last_generation
+        if not (last_generation.truck_weights[best_row] <= capacities).all():
+            # without child repair every row can be overloaded, the loaded row is repaired on its own instead
+            best_assignment = FleetAssignment(self.packages.weights, self.package_fitness, capacities, last_generation.genomes[[best_row]],
+                                              self.crossover_operator, self.telemetry, self.parameters)
+            best_assignment.repair()
+            best_row = 0
+        self.telemetry.record("solution", engine=self.engine, fitness=float(best_assignment.fitness[best_row]))
+        self.record_plan("fleet", start, best_assignment.fitness[best_row])
+        loaded_indices = []
+        for truck in self.fleet:
+            truck_indices = best_assignment.truck_indices(best_row, truck.id)
+            truck.load_packages(self.packages.take(truck_indices))
+            loaded_indices.append(truck_indices)
+            self.telemetry.record("truck", truck=truck.id, weight=truck.weight, packages=len(truck.packages))
+
+        self.remove_packages(np.concatenate(loaded_indices))
+
+    def genetic_algorithm_islands(self) -> Solution:
+        start = time.perf_counter()
+        package_fitness = self.package_fitness
+        island_model = IslandModel(self.packages.weights, self.packages.price_categories, package_fitness, random_generator,
+                                   population_size=self.parameters.population_size, repair=self.repair_children, crossover_operator=self.crossover_operator,
+                                   telemetry=self.telemetry, parameters=self.parameters)
+        try:
+            with self.telemetry.phase("initialization"):
+                # every island is seeded like the matrix engine's population
+                island_model.seed(np.stack([self.generate_initial_genomes() for _ in range(island_model.amt_islands)]))
+            executor = self.island_executor if self.island_executor is not None else ProcessPoolExecutor(max_workers=island_model.amt_islands)
+            try:
+                island, row = island_model.run(executor, self.planning_deadline)
+            finally:
+                if executor is not self.island_executor:
+                    executor.shutdown()
+            include_indices = island_model.include_indices(island, row)
+        finally:
+            island_model.close()
+        self.generation_history.extend(island_model.history)
+        self.record_run(start, island_model.generation)
+
+        best_solution = Solution(self.packages, self.max_deadline, self.min_deadline, include_indices=include_indices, package_fitness=package_fitness,
+                                 weight_weight=self.parameters.weight_weight)
+        self.record_solution(best_solution)
+        return best_solution
 
-        mutation_rate = Constants.MUTATION_RATE.value * counter_avg_seen
-        if mutation_rate > Constants.MAX_MUTATION_RATE.value: mutation_rate = Constants.MAX_MUTATION_RATE.value
+    def generate_next_generation(self, old_generation: list[Solution], counter_avg_seen: int):
+        telemetry = self.telemetry
+        parameters = self.parameters
+        fitness = np.array([solution.fitness for solution in old_generation])
+        with telemetry.phase("elitism"):
+            elite_rows = np.argsort(fitness)[::-1][:parameters.elitism_participants]
+            new_population = [old_generation[row].copy() for row in elite_rows]
+
+        # selection, crossover, mutation and repair run on the children's genome matrix in a few array operations
+        amt_children = parameters.population_size - len(new_population)
+        amt_pairs = (amt_children + 1) // 2
+        with telemetry.phase("selection"):
+            parents = select_tournament_winners(fitness, 2 * amt_pairs, parameters.amt_tournament_participants, random_generator)
+            parent_genomes = self.solution_genomes([old_generation[row] for row in parents])
+        with telemetry.phase("crossover"):
+            children = crossover_genomes(parent_genomes[:amt_pairs], parent_genomes[amt_pairs:], random_generator, self.crossover_operator,
+                                         parameters.crossover_rate)[:amt_children]
+
+        with telemetry.phase("mutation"):
+            mutation_rate = min(parameters.mutation_rate * counter_avg_seen, parameters.max_mutation_rate)
+            mutate_genomes(children, mutation_rate, random_generator)
+
+        if self.repair_children:
+            with telemetry.phase("repair"):
+                self.repair_stats["children"] += amt_children
+                self.repair_stats["repaired"] += repair_genomes(children, self.packages.weights, self.repair_order)
+
+        with telemetry.phase("evaluation"):
+            return new_population + self.solutions_from_parents(children, [old_generation[row] for row in parents[:amt_children]], parent_genomes[:amt_children])
+
+    def solutions_from_parents(self, genomes: np.ndarray, parents: list[Solution], parent_genomes: np.ndarray) -> list[Solution]:
+        # Child row i takes its first genes from parents[i], so it starts as a copy of that parent and only the genes that
+        # crossover, mutation and repair changed update its running sums. One update in Python costs about as much as summing
+        # several packages with numpy, so a child that changed more than an eighth as many genes as its parent carries is
+        # summed up again instead.
+        rows, changed = np.nonzero(genomes != parent_genomes)
+        row_ends = np.searchsorted(rows, np.arange(1, len(genomes) + 1)).tolist()
+        included = genomes[rows, changed].tolist()
+        changed = changed.tolist()
+
+        solutions = [None] * len(genomes)
+        rebuilt_rows = []
+        row_start = 0
+        for row, (parent, row_end) in enumerate(zip(parents, row_ends)):
+            if 8 * (row_end - row_start) > len(parent.include_indices):
+                rebuilt_rows.append(row)
+            else:
+                solution = parent.copy()
+                for index, include in zip(changed[row_start:row_end], included[row_start:row_end]):
+                    if include:
+                        solution.append_index(index)
+                    else:
+                        solution.remove_index(index)
+                solutions[row] = solution
+            row_start = row_end
+
+        for row, solution in zip(rebuilt_rows, self.solutions_from_genomes(genomes[rebuilt_rows])):
+            solutions[row] = solution
+        return solutions
+
+    def solution_genomes(self, solutions: list[Solution]) -> np.ndarray:
+        genomes = np.zeros((len(solutions), self.amt_packages), dtype=bool)
+        for row, solution in enumerate(solutions):
+            genomes[row, solution.include_indices] = True
+        return genomes
+
+    def solutions_from_genomes(self, genomes: np.ndarray) -> list[Solution]:
+        # a genome seen before in this run takes its cached sums instead of being summed up again, the cache keeps only the
+        # three sums per genome like the matrix engine's and the solution is rebuilt from the genome
+        max_deadline, min_deadline, package_fitness, weight_weight = self.max_deadline, self.min_deadline, self.package_fitness, self.parameters.weight_weight
+        solutions = []
+        for genome, key in zip(genomes, self.fitness_cache.genome_keys(genomes)):
+            sums = self.fitness_cache.get(key)
+            solution = Solution(self.packages, max_deadline, min_deadline, include_indices=np.flatnonzero(genome).tolist(), package_fitness=package_fitness,
+                                weight_weight=weight_weight, sums=sums)
+            if sums is None:
+                self.fitness_cache.put(key, solution.sums)
+            solutions.append(solution)
+        return solutions
 
-        for index in range(self.amt_packages):
-            if uniform(0, 1) <= mutation_rate:
-                if index in solution_copy.include_indices:
-                    solution_copy.remove_index(index)
-                else:
-                    solution_copy.append_index(index)
-        return solution_copy
+    def calculate_average_fitness(self, population: list[Solution]):
+        return sum([solution.fitness for solution in population]) / len(population)
 
-    def increment_late_days(self):
-        for package in self.packages:
-            package.deadline -= 1
-            print(package.deadline)
-        print("days to deadline decremented")
+    def generate_random_solutions(self, population_size: int = None, population_key: int = None) -> list[Solution]:
+        return self.solutions_from_genomes(self.generate_initial_genomes(population_size, population_key))
+
+    def generate_initial_genomes(self, population_size: int = None, population_key: int = None) -> np.ndarray:
+        # survivors of the previous run with the same key come first, then greedy seeds, then random loads
+        population_size = population_size if population_size is not None else self.parameters.population_size
+        weights = self.packages.weights
+        amt_seeded = min(int(population_size * self.greedy_seed_ratio), population_size)
+        surviving_genomes = self.surviving_genomes(population_key)
+        if surviving_genomes is None:
+            surviving_genomes = np.zeros((0, self.amt_packages), dtype=bool)
+        surviving_genomes = surviving_genomes[:population_size - amt_seeded]
+        if len(surviving_genomes) > 0:
+            repair_genomes(surviving_genomes, weights, self.repair_order) # shipped packages left gaps, fill them
+
+        greedy_genomes = generate_greedy_loads(weights, package_values(weights, self.package_fitness, self.parameters.weight_weight), amt_seeded, Constants.WEIGHT_LIMIT.value, random_generator)
+        random_genomes = generate_random_loads(weights, population_size - amt_seeded - len(surviving_genomes), random_generator)
+        return np.concatenate((surviving_genomes, greedy_genomes, random_genomes))
+
+    def generate_initial_assignments(self, capacities: np.ndarray, population_key=None) -> np.ndarray:
+        # survivors of the previous run with the same key, greedy fleet loads and random cuts, in the shares generate_initial_genomes uses
+        population_size = self.parameters.population_size
+        weights = self.packages.weights
+        amt_seeded = min(int(population_size * self.greedy_seed_ratio), population_size)
+        surviving_genomes = self.surviving_genomes(population_key, WAREHOUSE)
+        if surviving_genomes is None:
+            surviving_genomes = np.zeros((0, self.amt_packages), dtype=np.int8)
+        surviving_genomes = surviving_genomes[:population_size - amt_seeded]
+        if len(surviving_genomes) > 0:
+            # the shipped packages left the survivors' trucks nearly empty, fill them
+            FleetAssignment(weights, self.package_fitness, capacities, surviving_genomes, self.crossover_operator, parameters=self.parameters).repair()
+
+        greedy_genomes = generate_greedy_assignments(weights, package_values(weights, self.package_fitness, self.parameters.weight_weight), capacities, amt_seeded,
+                                                     random_generator)
+        random_genomes = generate_random_assignments(weights, capacities, population_size - amt_seeded - len(surviving_genomes), random_generator)
+        return np.concatenate((surviving_genomes, greedy_genomes, random_genomes))
+
+    def store_surviving_population(self, population_key, genomes):
+        # genomes is a callable so nothing is built when warm starts are off
+        if self.warm_start and population_key is not None:
+            self.surviving_populations[population_key] = (self.packages.ids.copy(), genomes().copy())
+
+    def surviving_genomes(self, population_key, fill_value=False) -> np.ndarray | None:
+        # filled by warm starts and by checkpoints of an earlier inventory
+        if population_key not in self.surviving_populations:
+            return None
+        package_ids, genomes = self.surviving_populations[population_key]
+        return remap_genomes(genomes, package_ids, self.packages.ids, fill_value)
+
+    def checkpoint_filepath(self, population_key) -> str:
+        return os.path.join(self.checkpoint_dir, f"{self.engine}_{population_key}.npz")
+
+    def checkpoint_due(self, generation: int) -> bool:
+        return self.checkpoint_dir is not None and self.checkpoint_interval > 0 and generation % self.checkpoint_interval == 0
+
+    def save_checkpoint(self, population_key, genomes: np.ndarray, generation: int, counter_avg_seen: int, best_fitness: float, finished: bool = False):
+        with self.telemetry.phase("checkpoint"):
+            checkpoint = Checkpoint(genomes, self.packages.ids, generation, counter_avg_seen, float(best_fitness), random_generator.bit_generator.state, finished)
+            checkpoint.save(self.checkpoint_filepath(population_key))
+
+    def resume_checkpoint(self, population_key) -> Checkpoint | None:
+        # A checkpoint taken on the current inventory is returned with the random generator restored, so the run continues exactly.
+        # A checkpoint of another inventory only seeds the population, like a warm start.
+        if not self.resume or self.checkpoint_dir is None or not os.path.exists(self.checkpoint_filepath(population_key)):
+            return None
+
+        checkpoint = Checkpoint.load(self.checkpoint_filepath(population_key))
+        if not checkpoint.matches(self.packages.ids):
+            self.seed_from_checkpoint(checkpoint, population_key)
+            return None
+
+        random_generator.bit_generator.state = checkpoint.rng_state
+        self.telemetry.record("resume", population_key=population_key, generation=checkpoint.generation, finished=checkpoint.finished)
+        return checkpoint
+
+    def seed_from_checkpoint(self, checkpoint: Checkpoint | str, population_key):
+        # the checkpoint's genomes start the next run with this key, remapped to the inventory of that moment
+        if isinstance(checkpoint, str):
+            checkpoint = Checkpoint.load(checkpoint)
+        self.surviving_populations[population_key] = (checkpoint.package_ids, checkpoint.genomes)
+
+    def increment_late_days(self, days: int = 1):
+        self.packages.advance_days(days)
+        self.days_since_save += days
+        self.invalidate_package_fitness()
+        self.telemetry.record("late_days", packages=self.amt_packages, late_packages=self.packages.amt_late)
+
+    def simulate_days(self, amt_days: int, on_day=None) -> list[dict]:
+        # Ships one fleet load per day until amt_days have passed or the inventory is empty, deadlines move one day closer between days.
+        # on_day is called with every day report while that day's fleet is still loaded.
+        day_reports = []
+        for day in range(amt_days):
+            if self.amt_packages == 0:
+                break
+            if day > 0:
+                self.increment_late_days()
+
+            start = time.perf_counter()
+            self.reset_fleet()
+            self.load_fleet()
+            day_reports.append(self.day_report(day, time.perf_counter() - start))
+            if on_day is not None:
+                on_day(day_reports[-1])
+        return day_reports
+
+    def day_report(self, day: int, seconds: float = None) -> dict:
+        day_report = {
+            "day": day,
+            "seconds": seconds,
+            "packages_loaded": sum(len(truck.packages) for truck in self.fleet),
+            "profit": int(self.calculate_profit_fleet()),
+            "fleet_late_fees": int(self.calculate_late_fees_fleet()),
+            "packages_remaining": self.amt_packages,
+            "inventory_late_fees": self.packages.total_late_fees,
+            "time_budget": self.time_budget,
+            "plans": list(self.planning_reports),
+            "trucks": [truck.report() for truck in self.fleet],
+        }
+        self.telemetry.record("day", **{key: value for key, value in day_report.items() if key not in ("trucks", "plans")})
+        return day_report
 
     def reset_fleet(self):
         for truck in self.fleet:
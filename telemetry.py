@@ -0,0 +1,75 @@
+from collections import Counter
+from contextlib import contextmanager
+import json
+import time
+
+import numpy as np
+
+class Telemetry:
+    # Collects phase timings and per-generation statistics and passes them as dict records to a sink, any callable
+    # taking one record. Without a sink nothing is measured, so the default path stays quiet and cheap.
+    def __init__(self, sink=None):
+        self.sink = sink
+        self.phase_seconds = Counter()
+        self.run = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.sink is not None
+
+    @contextmanager
+    def phase(self, name: str):
+        if self.sink is None:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_seconds[name] += time.perf_counter() - start
+
+    def start_run(self):
+        self.run += 1
+        self.phase_seconds.clear()
+
+    def record(self, event: str, **fields):
+        if self.sink is not None:
+            self.sink({"event": event, "run": self.run, **fields})
+
+    def record_generation(self, generation: int, fitness: np.ndarray, feasible_ratio: float, evaluations: int, **fields):
+        if self.sink is not None:
+            self.record("generation", generation=generation, best_fitness=float(fitness.max()), average_fitness=float(fitness.mean()),
+                        worst_fitness=float(fitness.min()), feasible_ratio=float(feasible_ratio), evaluations=int(evaluations), **fields)
+
+    def record_phases(self, **fields):
+        # phase totals since start_run
+        if self.sink is not None:
+            self.record("phases", seconds=dict(self.phase_seconds), **fields)
+
+class MemorySink:
+    def __init__(self):
+        self.records = []
+
+    def __call__(self, record: dict):
+        self.records.append(record)
+
+    def events(self, event: str) -> list[dict]:
+        return [record for record in self.records if record["event"] == event]
+
+class JsonLinesSink:
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.file = open(filepath, "a", encoding='utf-8')
+
+    def __call__(self, record: dict):
+        self.file.write(json.dumps(record) + "\n")
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,15 +1,46 @@
+import asyncio
+import contextlib
+import io
+import json
+import os
+import threading
+import time
+import tempfile
 import unittest
 from unittest.mock import MagicMock
 
 import numpy as np
 
 from filehandler import FileHandler, Package
+from package import PackageColumns
 from decimal import Decimal
 from delivery_truck import DeliveryTruck
+import shipping_company as shipping_company_module
 from shipping_company import ShippingCompany, Solution
+from population_matrix import (CROSSOVER_OPERATORS, PopulationMatrix, calculate_repair_order, crossover_genomes, mutate_genomes, remap_genomes,
+                               repair_genomes, sample_mutation_positions, select_tournament_winners)
+from island_model import IslandModel
+from fleet_assignment import FleetAssignment, WAREHOUSE, generate_greedy_assignments
+from knapsack import generate_greedy_loads, package_values, solve_knapsack_dp, solve_knapsack_greedy
+from fitness_cache import FitnessCache
+from telemetry import MemorySink, Telemetry
+from checkpoint import Checkpoint
+from package_feed import PackageFeed
+from benchmark import generate_synthetic_inventory
+from service import DispatchService
+from parameters import GAParameters
+from constants import Constants
+from tuning import sample_configurations, tune
+import main as main_module
+from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor
 
 # These tests are out of date and will not run!
 
+def sample_packages(amt: int = 60) -> list[Package]:
+    # a small inventory heavier than one truck, shared by the planning tests
+    return [Package(id, 50.0 + id * 7 % 100, id % 9 + 1, id % 7 - 2) for id in range(amt)]
+
 class TestFilehandler(unittest.TestCase):
     def setUp(self):
         self.filehandler = FileHandler()
@@ -18,7 +49,10 @@ class TestFilehandler(unittest.TestCase):
             "1, 1.0, 2, 1",
             "2, 2.0, 1, 0"
         ]
-        self.TEST_FILEPATH = "test_lagerstatus.csv"
+        temporary_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary_directory.cleanup)
+        self.dirpath = temporary_directory.name
+        self.TEST_FILEPATH = os.path.join(self.dirpath, "test_lagerstatus.csv")
 
         with open(self.TEST_FILEPATH, "w", encoding='utf-8') as f:
             f.writelines("\n".join(self.test_package_info))
@@ -34,6 +68,28 @@ class TestFilehandler(unittest.TestCase):
             ]
         )
 
+    def test_4_creates_package_columns(self):
+        package_columns = self.filehandler.create_package_columns_from_file(self.TEST_FILEPATH)
+
+        self.assertListEqual(package_columns.ids.tolist(), [1, 2])
+        self.assertListEqual(package_columns.weights.tolist(), [1.0, 2.0])
+        self.assertListEqual(package_columns.price_categories.tolist(), [2, 1])
+        self.assertListEqual(package_columns.deadlines.tolist(), [1, 0])
+        self.assertEqual(package_columns[1].weight, 2.0)
+
+    def test_5_package_columns_cache_rebuilt_when_file_changes(self):
+        self.filehandler.create_package_columns_from_file(self.TEST_FILEPATH)
+        cached_columns = self.filehandler.create_package_columns_from_file(self.TEST_FILEPATH)
+        self.assertEqual(self.filehandler.last_load_source, "cache")
+        self.assertListEqual(cached_columns.ids.tolist(), [1, 2])
+
+        with open(self.TEST_FILEPATH, "a", encoding='utf-8') as f:
+            f.write("\n3, 3.0, 4, -2")
+
+        package_columns = self.filehandler.create_package_columns_from_file(self.TEST_FILEPATH)
+        self.assertEqual(self.filehandler.last_load_source, "csv")
+        self.assertListEqual(package_columns.ids.tolist(), [1, 2, 3])
+
     def test_2_update_packages(self):
         packages_list = [
             Package(3, 1.0, Decimal(2),1),
@@ -49,6 +105,62 @@ class TestFilehandler(unittest.TestCase):
         ]
 
         self.filehandler.update_stock_status(packages_list, self.TEST_FILEPATH)
+
+    def test_6_stock_changes_survive_torn_writes_and_compaction(self):
+        filepath = os.path.join(self.dirpath, "test_stock_lagerstatus.csv")
+        generate_synthetic_inventory(filepath, 2000, seed=4)
+        stock = self.filehandler.load_stock_status(filepath)
+        first_id, second_id = stock.ids[:2].tolist()
+
+        stock.remove([0])
+        stock.advance_days(1)
+        stock.extend([Package(1, 3.0, 4, 5)])
+        self.filehandler.update_stock_status(stock, filepath)
+
+        change = json.loads(open(filepath + ".changes", encoding='utf-8').read().split("\n")[1])
+        self.assertEqual((change["days"], change["removed"], change["added"]["ids"]), (1, [first_id], [1]))
+
+        with open(filepath + ".changes", "a", encoding='utf-8') as log_file:
+            log_file.write('{"days": 3, "remo') # a save that crashed midway
+        self.filehandler.append_stock_changes(filepath, removed_ids=[second_id])
+        stock.remove_ids([second_id])
+        saved = self.filehandler.load_stock_status(filepath)
+        self.assertCountEqual(saved.ids.tolist(), stock.ids.tolist())
+        self.assertEqual(saved.total_late_fees, stock.total_late_fees)
+
+        stale_log = open(filepath + ".changes", encoding='utf-8').read()
+        self.filehandler.compact_stock_status(filepath)
+        self.assertFalse(os.path.exists(filepath + ".changes"))
+        with open(filepath + ".changes", "w", encoding='utf-8') as log_file:
+            log_file.write(stale_log) # a compaction that crashed after replacing the csv
+        saved = self.filehandler.load_stock_status(filepath)
+        self.assertCountEqual(zip(saved.ids.tolist(), saved.weights.tolist(), saved.deadlines.tolist()),
+                              zip(stock.ids.tolist(), stock.weights.tolist(), stock.deadlines.tolist()))
+
+    def test_7_touched_csv_keeps_its_stock_changes(self):
+        filepath = os.path.join(self.dirpath, "test_stock_lagerstatus.csv")
+        generate_synthetic_inventory(filepath, 2000, seed=5)
+        first_id, second_id = self.filehandler.load_stock_status(filepath).ids[:2].tolist()
+        self.filehandler.append_stock_changes(filepath, removed_ids=[first_id])
+
+        stat = os.stat(filepath)
+        os.utime(filepath, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertNotIn(first_id, self.filehandler.load_stock_status(filepath).ids.tolist())
+
+        self.filehandler.append_stock_changes(filepath, removed_ids=[second_id])
+        saved = self.filehandler.load_stock_status(filepath)
+        self.assertEqual(len(saved), 1998)
+        self.assertFalse(np.isin([first_id, second_id], saved.ids).any())
+
+    def test_8_failed_cache_write_is_reported_on_stderr(self):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        self.filehandler.cache_dirpath = lambda filepath: self.TEST_FILEPATH # a file, not a directory
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            package_columns = self.filehandler.create_package_columns_from_file(self.TEST_FILEPATH)
+
+        self.assertListEqual(package_columns.ids.tolist(), [1, 2])
+        self.assertEqual(stdout.getvalue(), "")
+        self.assertIn("Could not write package cache", stderr.getvalue())
     #
     # def tearDown(self):
     #     if os.path.exists(self.TEST_FILEPATH):
@@ -89,6 +201,30 @@ class TestDeliveryTruck(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.truck.unload_package(Package(100, 100, Decimal(2), 0))
 
+    def test_5_report_is_json_serializable(self):
+        self.truck.load_packages(PackageColumns.from_packages([Package(1, 1.5, 2, -2), Package(2, 3.0, 5, 1)]))
+
+        report = json.loads(json.dumps(self.truck.report()))
+
+        self.assertEqual(report["weight"], 4.5)
+        self.assertEqual(report["profit"], 7)
+        self.assertEqual(report["late_fees"], 4)
+        self.assertDictEqual(report["deadline_counts"], {"-2": 1, "1": 1})
+
+    def test_6_loads_are_kept_as_columns(self):
+        self.truck.load_packages(PackageColumns.from_packages([Package(1, 1.5, 2, -2), Package(2, 3.0, 5, 1)]))
+        self.truck.load_packages(PackageColumns.from_packages([Package(3, 2.0, 5, -1)]))
+
+        self.assertIsInstance(self.truck.packages, PackageColumns)
+        self.assertListEqual(self.truck.packages.ids.tolist(), [1, 2, 3])
+        self.assertEqual(self.truck.total_price(), 12)
+        self.assertEqual(self.truck.total_late_fees(), 5)
+        self.assertDictEqual(dict(self.truck.price_category_counts()), {2: 1, 5: 2})
+
+        self.truck.empty_load()
+        self.assertEqual(len(self.truck.packages), 0)
+        self.assertEqual(self.truck.total_price(), 0)
+
 class TestPackage(unittest.TestCase):
     def test_1_late_fee_returns_0_if_not_late(self):
         package = Package(1, 1.0, Decimal(2), 0)
@@ -100,6 +236,48 @@ class TestPackage(unittest.TestCase):
 
         self.assertEqual(package.late_fee, Decimal(100))
 
+class TestPackageColumns(unittest.TestCase):
+    def test_1_fitness_matches_packages(self):
+        packages = [Package(1, 1, 2, 3), Package(2, 1, 9, -4), Package(3, 1, 5, 0), Package(4, 1, 1, 6)]
+        package_columns = PackageColumns.from_packages(packages)
+
+        for package, fitness in zip(packages, package_columns.recalculate_fitness(-4, 6)):
+            self.assertEqual(fitness, package.recalculate_fitness(-4, 6))
+
+    def test_2_pop_returns_package_and_removes_row(self):
+        package_columns = PackageColumns.from_packages([Package(1, 1, 2, 3), Package(2, 4, 9, -4)])
+
+        package = package_columns.pop(1)
+
+        self.assertEqual((package.id, package.weight, package.late_fee), (2, 4, 16))
+        self.assertListEqual(package_columns.ids.tolist(), [1])
+
+    def test_3_advance_days_updates_deadlines_and_late_fees(self):
+        package_columns = PackageColumns.from_packages([Package(1, 1, 2, 1), Package(2, 4, 9, -4)])
+
+        package_columns.advance_days(2)
+
+        self.assertListEqual(package_columns.deadlines.tolist(), [-1, -6])
+        self.assertListEqual(package_columns.late_fees.tolist(), [1, 36])
+
+    def test_4_swap_remove_keeps_index_and_aggregates(self):
+        rng = np.random.default_rng(1)
+        package_columns = PackageColumns(np.arange(100, 150), rng.integers(1, 120, 50) / 10, rng.integers(1, 10, 50), rng.integers(-5, 10, 50))
+        package_columns.position(100) # build the index before changing the rows
+
+        package_columns.remove([0, 3, 48, 49, 20])
+        package_columns.remove_ids([110, 147])
+        package_columns.extend(PackageColumns([500, 501], [1.0, 2.0], [9, 1], [-9, 12]))
+
+        self.assertEqual(len(package_columns), 45)
+        self.assertNotIn(110, package_columns.ids.tolist())
+        for position, id in enumerate(package_columns.ids.tolist()):
+            self.assertEqual(package_columns.position(id), position)
+        self.assertEqual((package_columns.min_deadline, package_columns.max_deadline), (-9, 12))
+        self.assertEqual(package_columns.deadline_counts, PackageColumns.count_deadlines(package_columns.deadlines))
+        self.assertEqual(package_columns.total_price_category, int(package_columns.price_categories.sum()))
+        self.assertEqual(package_columns.total_late_fees, int(package_columns.late_fees.sum()))
+
 class TestSolution(unittest.TestCase):
     def test_1_normalizes_package_profit(self):
         test_bitarray = np.fromiter([True, True, True], bool)
@@ -153,6 +331,37 @@ class TestSolution(unittest.TestCase):
 
         self.assertEqual(test_solution.average_profit_category, Decimal(6))
 
+    def test_5_copy_shares_packages_and_copies_genome_on_write(self):
+        packages = [Package(1, 1, 2, 1), Package(2, 1, 2, 1), Package(3, 1, 2, -1)]
+        solution = Solution(packages, 1, -1, include_indices=[0, 1])
+
+        solution_copy = solution.copy()
+        solution_copy.append_index(2)
+
+        self.assertIs(solution_copy.packages, solution.packages)
+        self.assertListEqual(solution.include_indices, [0, 1])
+        self.assertListEqual(solution_copy.include_indices, [0, 1, 2])
+
+    def test_6_incremental_updates_match_full_recalculation(self):
+        packages = [Package(1, 1.5, 2, 1), Package(2, 300.0, 9, -3), Package(3, 450.0, 5, 4), Package(4, 60.2, 1, 0)]
+        solution = Solution(packages, 4, -3, include_indices=[0, 1])
+
+        solution.append_index(2)
+        solution.remove_index(0)
+        solution.append_index(3)
+
+        expected = Solution(packages, 4, -3, include_indices=[1, 2, 3])
+        self.assertCountEqual(solution.include_indices, [1, 2, 3])
+        self.assertTrue(solution.includes(3))
+        self.assertFalse(solution.includes(0))
+        self.assertAlmostEqual(solution.total_weight, expected.total_weight)
+        self.assertAlmostEqual(solution.average_profit_category, expected.average_profit_category)
+        self.assertAlmostEqual(solution.fitness, 0)  # 810.2 kg is over the weight limit
+
+        solution.remove_index(2)
+        expected = Solution(packages, 4, -3, include_indices=[1, 3])
+        self.assertAlmostEqual(solution.fitness, expected.fitness)
+
 class TestShippingCompany(unittest.TestCase):
     def test_1_creates_random_solutions(self):
         shipping_company = ShippingCompany([])
@@ -161,62 +370,607 @@ class TestShippingCompany(unittest.TestCase):
             for rand_solution in shipping_company.generate_random_solutions(10):
                 f.write(str(rand_solution.bitarray) + "\n")
 
-    def test_2_produces_two_crossover_children(self):
-        package1 = Package(1, 1, Decimal(2), 1)
-        package2 = Package(2, 1, Decimal(2), 1)
-        packages = [package1, package2]
+    def test_4_calculates_average_fitness(self):
+        mock_solution1 = MagicMock(spec=Solution, fitness = 10)
+        mock_solution2 = MagicMock(spec=Solution, fitness = 10)
+        mock_solution3 = MagicMock(spec=Solution, fitness = 10)
+        generation = [mock_solution2, mock_solution1, mock_solution3]
 
-        parent1 = Solution(packages, np.fromiter([True, True], bool), 2, 100)
-        parent2 = Solution(packages, np.fromiter([False, False], bool), 2, 100)
+        shipping_company = ShippingCompany()
+
+        average = shipping_company.calculate_average_fitness(generation)
 
+        self.assertEqual(average, 10)
+
+    def test_5_package_fitness_recomputed_after_inventory_change(self):
+        packages = [Package(1, 1, 2, 1), Package(2, 1, 2, 3), Package(3, 1, 2, -1)]
         shipping_company = ShippingCompany(packages)
 
-        children = shipping_company.produce_two_children([parent1, parent2], crossover_rate=100)
+        package_fitness = shipping_company.package_fitness
+        self.assertIs(shipping_company.package_fitness, package_fitness)
+        self.assertEqual(package_fitness[1], packages[1].recalculate_fitness(-1, 3))
+
+        shipping_company.increment_late_days()
+
+        self.assertIsNot(shipping_company.package_fitness, package_fitness)
+        self.assertEqual(shipping_company.package_fitness[1], Package(2, 1, 2, 2).recalculate_fitness(-2, 2))
+
+    def test_6_telemetry_records_generations_and_phases_quietly(self):
+        packages = [Package(id, 100.0 + id, id % 9 + 1, id % 7 - 2) for id in range(20)]
+        sink = MemorySink()
+        shipping_company = ShippingCompany(packages, engine="matrix", telemetry=Telemetry(sink))
+
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            best_solution = shipping_company.genetic_algorithm()
+
+        self.assertEqual(output.getvalue(), "")
+        generations = sink.events("generation")
+        self.assertEqual([record["generation"] for record in generations], list(range(len(generations))))
+        self.assertAlmostEqual(max(record["best_fitness"] for record in generations), best_solution.fitness)
+        self.assertTrue(all(0 <= record["feasible_ratio"] <= 1 for record in generations))
+
+        phases = sink.events("phases")[0]["seconds"]
+        self.assertTrue({"initialization", "evaluation", "elitism", "selection", "crossover", "mutation"} <= phases.keys())
+
+    def test_7_resumes_interrupted_run_exactly(self):
+        packages = sample_packages()
+        self.addCleanup(setattr, shipping_company_module, "random_generator", shipping_company_module.random_generator) # the runs below seed it
+
+        def interrupt(record):
+            if record["event"] == "generation" and record["generation"] == 3:
+                raise KeyboardInterrupt
+
+        def plan(shipping_company):
+            # the fleet engine plans all trucks at once, the others one truck per run
+            if shipping_company.engine == "fleet":
+                shipping_company.load_fleet()
+                return [truck.packages.ids.tolist() for truck in shipping_company.fleet], shipping_company.calculate_profit_fleet()
+            best_solution = shipping_company.genetic_algorithm()
+            return best_solution.include_indices, best_solution.fitness
+
+        for engine, population_key in (("solution", None), ("matrix", None), ("fleet", "fleet")):
+            with self.subTest(engine=engine), tempfile.TemporaryDirectory() as checkpoint_dir:
+                shipping_company_module.random_generator = np.random.default_rng(7)
+                expected = plan(ShippingCompany(packages, engine=engine))
+
+                shipping_company_module.random_generator = np.random.default_rng(7)
+                interrupted = ShippingCompany(packages, engine=engine, telemetry=Telemetry(interrupt), checkpoint_dir=checkpoint_dir, checkpoint_interval=1)
+                with self.assertRaises(KeyboardInterrupt):
+                    plan(interrupted)
+                self.assertEqual(Checkpoint.load(os.path.join(checkpoint_dir, f"{engine}_{population_key}.npz")).generation, 2)
+
+                shipping_company_module.random_generator = np.random.default_rng(0) # replaced by the checkpointed state
+                resumed = plan(ShippingCompany(packages, engine=engine, checkpoint_dir=checkpoint_dir, resume=True))
+
+                self.assertEqual(resumed, expected)
+
+    def test_8_checkpoint_round_trip(self):
+        genomes = np.random.default_rng(0).random((5, 13)) < 0.5
+        rng_state = np.random.default_rng(3).bit_generator.state
+        with tempfile.TemporaryDirectory() as checkpoint_dir:
+            filepath = os.path.join(checkpoint_dir, "population.npz")
+            Checkpoint(genomes, np.arange(13), 4, 2, 12.5, rng_state, finished=True).save(filepath)
+            checkpoint = Checkpoint.load(filepath)
+
+        np.testing.assert_array_equal(checkpoint.genomes, genomes)
+        np.testing.assert_array_equal(checkpoint.package_ids, np.arange(13))
+        self.assertEqual((checkpoint.generation, checkpoint.counter_avg_seen, checkpoint.best_fitness, checkpoint.finished), (4, 2, 12.5, True))
+        self.assertEqual(checkpoint.rng_state, rng_state)
+
+    def test_9_time_budget_returns_best_so_far(self):
+        packages = sample_packages()
+        shipping_company = ShippingCompany(packages, engine="matrix", time_budget=0)
+
+        shipping_company.load_fleet()
+
+        self.assertTrue(shipping_company.planning_reports)
+        for plan in shipping_company.planning_reports:
+            self.assertEqual((plan["generations"], plan["stopped"]), (0, "time_budget"))
+            self.assertGreater(plan["fitness"], 0)
+        self.assertTrue(all(truck.weight <= truck.max_weight for truck in shipping_company.fleet))
+        self.assertIsNone(shipping_company.planning_deadline)
+
+    def test_10_extends_population_with_packages_arriving_mid_run(self):
+        packages = sample_packages()
+
+        for engine in ("solution", "matrix"):
+            with self.subTest(engine=engine):
+                arrived = threading.Event()
+                sink = MemorySink()
+
+                def on_record(record):
+                    sink(record)
+                    if record["event"] == "generation" and record["generation"] == 2:
+                        arrived.set()
+
+                def batches():
+                    arrived.wait()
+                    yield PackageColumns.from_packages([Package(id, 5.0, 9, -2) for id in range(100, 110)])
+
+                feed = PackageFeed(batches())
+                shipping_company = ShippingCompany(packages, engine=engine, telemetry=Telemetry(on_record), package_feed=feed)
+                shipping_company.package_fitness # precomputed like in a running service
+                feed.finished.wait(1) # no batch yet, the feed is waiting for generation 2
+                best_solution = shipping_company.genetic_algorithm()
+
+                self.assertEqual(shipping_company.amt_packages, 70)
+                events = [record["event"] for record in sink.records]
+                self.assertIn("ingest", events)
+                self.assertEqual(events[events.index("ingest") - 1], "generation")
+                self.assertGreater(events.index("ingest"), 3)
+                np.testing.assert_allclose(shipping_company.package_fitness, shipping_company.packages.recalculate_fitness(-2, 4))
+                self.assertLessEqual(best_solution.total_weight, 800)
+                self.assertAlmostEqual(best_solution.fitness, Solution(shipping_company.packages, 4, -2, include_indices=best_solution.include_indices).fitness)
+
+    def test_11_saves_dispatched_days_as_stock_changes(self):
+        temporary_directory = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary_directory.cleanup)
+        filepath = os.path.join(temporary_directory.name, "test_stock_lagerstatus.csv")
+        generate_synthetic_inventory(filepath, 5000, seed=3)
+        filehandler = FileHandler()
+        shipping_company = ShippingCompany(filehandler.load_stock_status(filepath), engine="greedy")
+
+        shipping_company.load_fleet()
+        shipping_company.increment_late_days()
+        shipping_company.add_packages([Package(1, 2.0, 5, 3)])
+        shipping_company.save_stock_status(filepath)
+
+        self.assertLess(os.path.getsize(filepath + ".changes"), os.path.getsize(filepath))
+        stock = filehandler.load_stock_status(filepath)
+        order, saved_order = np.argsort(shipping_company.packages.ids), np.argsort(stock.ids)
+        np.testing.assert_array_equal(stock.ids[saved_order], shipping_company.packages.ids[order])
+        np.testing.assert_array_equal(stock.deadlines[saved_order], shipping_company.packages.deadlines[order])
+
+    def test_12_runs_its_own_parameter_profile(self):
+        packages = sample_packages()
+        profile = GAParameters(population_size=20, max_generations=3, price_cat_weight=2)
+        shipping_company = ShippingCompany(packages, engine="matrix", parameters=profile, crossover_operator="uniform")
+
+        self.assertEqual(shipping_company.crossover_operator, "uniform")
+        self.assertEqual(len(shipping_company.generate_initial_genomes()), 20)
+        np.testing.assert_allclose(shipping_company.package_fitness, shipping_company.packages.recalculate_fitness(-2, 4, price_cat_weight=2))
+        shipping_company.genetic_algorithm()
+        self.assertLessEqual(shipping_company.last_run["generations"], 3)
+        island_model = IslandModel(shipping_company.packages.weights, shipping_company.packages.price_categories, shipping_company.package_fitness,
+                                   np.random.default_rng(0), parameters=profile)
+        island_model.close()
+        self.assertEqual(island_model.shape[1], 20)
+
+        with tempfile.TemporaryDirectory() as profile_dir:
+            filepath = os.path.join(profile_dir, "profile.json")
+            profile.save(filepath)
+            self.assertEqual(GAParameters.load(filepath), profile)
+        with self.assertRaises(ValueError):
+            GAParameters(population_size=5, elitism_participants=5)
+        with self.assertRaises(ValueError):
+            GAParameters.from_dict({"mutation_rates": 0.1})
+
+    def test_13_fleet_warm_start_fills_survivors_and_keeps_greedy_seeds(self):
+        with tempfile.TemporaryDirectory() as inventory_dir:
+            filepath = os.path.join(inventory_dir, "lagerstatus.csv")
+            generate_synthetic_inventory(filepath, 5000, seed=2)
+            packages = FileHandler().create_package_columns_from_file(filepath, use_cache=False)
+        shipping_company = ShippingCompany(packages, engine="fleet", warm_start=True, parameters=GAParameters(max_generations=3))
+        shipping_company.simulate_days(1)
+        shipping_company.reset_fleet()
+        shipping_company.increment_late_days()
+
+        capacities = np.full(len(shipping_company.fleet), 800.0)
+        population = FleetAssignment(shipping_company.packages.weights, shipping_company.package_fitness, capacities,
+                                     shipping_company.generate_initial_assignments(capacities, "fleet"))
+
+        # 90 survivors refilled after yesterday's loads were shipped, then the greedy seeds
+        self.assertTrue(np.all(population.truck_weights <= capacities))
+        self.assertTrue(np.all(population.truck_weights[:90].sum(axis=1) > 0.95 * capacities.sum()))
+        greedy_fleet = generate_greedy_assignments(shipping_company.packages.weights, package_values(shipping_company.packages.weights, shipping_company.package_fitness),
+                                                   capacities, 1, np.random.default_rng(0))[0]
+        np.testing.assert_array_equal(population.genomes[90], greedy_fleet)
+
+    def test_14_children_are_built_from_their_parents_changed_genes(self):
+        packages = [Package(id, 5.0 + id % 7, id % 9 + 1, id % 7 - 2) for id in range(200)]
+        shipping_company = ShippingCompany(packages)
+        parents = shipping_company.generate_random_solutions(3)
+        parent_genomes = shipping_company.solution_genomes(parents)
+        genomes = parent_genomes.copy()
+        genomes[0, np.flatnonzero(genomes[0])[0]] = False # one gene, updated in place
+        genomes[1] = ~genomes[1] # every gene, summed up again
+
+        children = shipping_company.solutions_from_parents(genomes, parents, parent_genomes)
+
+        for genome, child in zip(genomes, children):
+            expected = Solution(shipping_company.packages, shipping_company.max_deadline, shipping_company.min_deadline, include_indices=np.flatnonzero(genome).tolist())
+            self.assertCountEqual(child.include_indices, expected.include_indices)
+            self.assertAlmostEqual(child.fitness, expected.fitness)
+            self.assertAlmostEqual(child.total_weight, expected.total_weight)
+        self.assertListEqual(parents[0].include_indices, np.flatnonzero(parent_genomes[0]).tolist())
+
+    def test_15_fitness_cache_keeps_sums_and_rebuilds_solutions(self):
+        packages = [Package(id, 5.0 + id % 7, id % 9 + 1, id % 7 - 2) for id in range(200)]
+        shipping_company = ShippingCompany(packages)
+        genomes = shipping_company.solution_genomes(shipping_company.generate_random_solutions(2))
 
-        self.assertTrue(
-            np.array_equal(
-                children[0].bitarray,
-                np.fromiter([True, False], bool)
-            )
-        )
+        first = shipping_company.solutions_from_genomes(genomes)
+        hits = shipping_company.fitness_cache.hits
+        again = shipping_company.solutions_from_genomes(genomes)
 
-        self.assertTrue(
-            np.array_equal(
-                children[1].bitarray,
-                np.fromiter([False, True], bool)
-            )
-        )
+        self.assertEqual(shipping_company.fitness_cache.hits, hits + 2)
+        self.assertTrue(all(isinstance(shipping_company.fitness_cache.get(key), tuple) for key in shipping_company.fitness_cache.genome_keys(genomes)))
+        for solution, cached in zip(first, again):
+            self.assertListEqual(cached.include_indices, solution.include_indices)
+            self.assertEqual((cached.fitness, cached.total_weight), (solution.fitness, solution.total_weight))
 
-    def test_3_mutates_child(self):
-        package1 = Package(1, 1, Decimal(2), 1)
-        package2 = Package(2, 1, Decimal(2), 1)
-        packages = [package1, package2]
+class TestPopulationMatrix(unittest.TestCase):
+    def setUp(self):
+        self.packages = [
+            Package(1, 1.5, 2, 1),
+            Package(2, 300.0, 9, -3),
+            Package(3, 450.0, 5, 4),
+            Package(4, 60.2, 1, 0),
+        ]
+        self.max_deadline = max(package.deadline for package in self.packages)
+        self.min_deadline = min(package.deadline for package in self.packages)
+        self.weights = np.array([package.weight for package in self.packages])
+        self.price_categories = np.array([package.price_category for package in self.packages])
+        self.package_fitness = np.array([package.recalculate_fitness(self.min_deadline, self.max_deadline) for package in self.packages])
+
+    def test_1_fitness_matches_solution(self):
+        genomes = np.array([
+            [True, True, False, False],
+            [True, False, True, True],
+            [False, True, True, True],  # over the weight limit
+        ])
+        population = PopulationMatrix(self.weights, self.price_categories, self.package_fitness, genomes)
+
+        for row in range(len(genomes)):
+            solution = Solution(self.packages, self.max_deadline, self.min_deadline, include_indices=population.include_indices(row))
+            self.assertAlmostEqual(population.fitness[row], solution.fitness)
+            self.assertAlmostEqual(population.total_weights[row], solution.total_weight)
+            self.assertAlmostEqual(population.average_profit_categories[row], solution.average_profit_category)
+
+    def test_2_random_population_respects_weight_limit(self):
+        population = PopulationMatrix.generate_random(self.weights, self.price_categories, self.package_fitness, 20, np.random.default_rng(0))
+
+        self.assertTrue(np.all(population.total_weights <= 800))
+        self.assertTrue(np.all(population.fitness > 0))
+
+    def test_3_repair_drops_lowest_value_per_kg_and_fills_capacity(self):
+        genomes = np.array([
+            [False, True, True, True],  # over the weight limit
+            [True, False, False, False],
+        ])
+        repair_order = calculate_repair_order(self.weights, self.package_fitness)
+
+        amt_repaired = repair_genomes(genomes, self.weights, repair_order)
+
+        self.assertEqual(amt_repaired, 1)
+        self.assertListEqual(genomes[0].tolist(), [True, True, False, True])
+        self.assertListEqual(genomes[1].tolist(), [True, True, False, True])
+        self.assertEqual(Constants.CHILD_REPAIR.name, "CHILD_REPAIR") # not an alias of another member
+        self.assertIs(GAParameters().repair_children, True)
+
+    def test_4_mutation_flips_sampled_positions(self):
+        rng = np.random.default_rng(0)
+        genomes = np.zeros((3, 4), dtype=bool)
+
+        mutate_genomes(genomes, 0, rng)
+        self.assertFalse(genomes.any())
+
+        mutate_genomes(genomes, 1, rng)
+        self.assertTrue(genomes.all())
+
+        positions = sample_mutation_positions(100000, 0.01, rng)
+        self.assertTrue(np.all(np.diff(positions) > 0))
+        self.assertAlmostEqual(len(positions) / 100000, 0.01, delta=0.002)
+
+    def test_5_tournament_and_crossover_operators(self):
+        rng = np.random.default_rng(0)
+        fitness = np.array([1.0, 5.0, 3.0, 0.0])
+
+        winners = select_tournament_winners(fitness, 50, 4, rng)
+        self.assertEqual(len(winners), 50)
+        self.assertGreater((winners == 1).mean(), 0.5)
+
+        parents1 = np.ones((20, 30), dtype=bool)
+        parents2 = np.zeros((20, 30), dtype=bool)
+        for operator in CROSSOVER_OPERATORS:
+            children = crossover_genomes(parents1, parents2, rng, operator, crossover_rate=1)
+            # every gene comes from exactly one parent, so the two children of a pair complement each other
+            self.assertTrue(np.array_equal(children[:20], ~children[20:]))
+            self.assertTrue(children[:20].any(axis=1).all())
+
+        children = crossover_genomes(parents1, parents2, rng, "two_point", crossover_rate=0)
+        self.assertTrue(np.array_equal(children, np.concatenate((parents1, parents2))))
+
+    def test_6_fitness_cache_scores_identical_genomes_once(self):
+        genomes = np.array([
+            [True, True, False, False],
+            [True, True, False, False],
+            [False, True, True, True],
+        ])
+        fitness_cache = FitnessCache(max_size=2)
+        cached_population = PopulationMatrix(self.weights, self.price_categories, self.package_fitness, genomes, fitness_cache=fitness_cache)
+        population = PopulationMatrix(self.weights, self.price_categories, self.package_fitness, genomes)
+
+        self.assertTrue(np.allclose(cached_population.fitness, population.fitness))
+        self.assertEqual((fitness_cache.hits, fitness_cache.misses), (0, 3))
+
+        PopulationMatrix(self.weights, self.price_categories, self.package_fitness, genomes[::-1].copy(), fitness_cache=fitness_cache).evaluate()
+        self.assertEqual((fitness_cache.hits, fitness_cache.misses), (3, 3))
+        self.assertEqual(len(fitness_cache), 2)
+
+    def test_7_remap_genomes_follows_package_ids(self):
+        genomes = np.array([
+            [True, False, True, False],
+            [False, True, True, True],
+        ])
+        old_ids = np.array([10, 40, 20, 30])
+        new_ids = np.array([30, 50, 10]) # 20 and 40 were shipped, 50 arrived
+
+        remapped_genomes = remap_genomes(genomes, old_ids, new_ids)
+
+        self.assertListEqual(remapped_genomes.tolist(), [[False, False, True], [True, False, False]])
+        self.assertListEqual(remap_genomes(genomes.astype(np.int8), old_ids, new_ids, fill_value=-1)[1].tolist(), [1, -1, 0])
+
+class TestIslandModel(unittest.TestCase):
+    def test_1_best_island_solution_is_feasible(self):
+        weights = np.array([1.5, 300.0, 450.0, 60.2, 700.0])
+        price_categories = np.array([2, 9, 5, 1, 3])
+        package_fitness = np.array([0.5, 2.0, 1.0, 0.1, 0.3])
+        island_model = IslandModel(weights, price_categories, package_fitness, np.random.default_rng(0), amt_islands=2, population_size=10, migration_interval=2, amt_migrants=1)
+        try:
+            with ProcessPoolExecutor(max_workers=2) as executor:
+                island, row = island_model.run(executor)
+            include_indices = island_model.include_indices(island, row)
+        finally:
+            island_model.close()
+
+        self.assertLessEqual(weights[include_indices].sum(), 800)
+        self.assertGreater(island_model.fitness[island, row], 0)
+
+    def test_2_seeded_islands_stop_at_the_deadline_and_count_on_after_migration(self):
+        weights = np.array([1.5, 300.0, 450.0, 60.2, 700.0])
+        island_model = IslandModel(weights, np.array([2, 9, 5, 1, 3]), np.array([0.5, 2.0, 1.0, 0.1, 0.3]), np.random.default_rng(0), amt_islands=2, population_size=4,
+                                   amt_migrants=1)
+        seeds = np.zeros(island_model.shape, dtype=bool)
+        seeds[0, :, 1] = True
+        seeds[1, :, 2] = True
+        try:
+            island_model.seed(seeds)
+            with ProcessPoolExecutor(max_workers=2) as executor:
+                island_model.evolve(executor, 0, initialize=True)
+                island_model.evolve(executor, 5, deadline=time.perf_counter())
+            np.testing.assert_array_equal(island_model.genomes, seeds)
+
+            island_model.counter_avg_seen[:] = 3
+            island_model.migrate()
+        finally:
+            island_model.close()
+
+        self.assertListEqual(island_model.counter_avg_seen.tolist(), [3, 3])
+        self.assertEqual(island_model.best_fitness[0], island_model.best_fitness[1])
+
+    def test_3_island_engine_shares_one_pool_and_rejects_warm_starts_and_checkpoints(self):
+        packages = sample_packages()
+        for options in ({"warm_start": True}, {"checkpoint_dir": "checkpoints"}, {"resume": True}):
+            with self.assertRaises(ValueError):
+                ShippingCompany(packages, engine="island", **options)
+
+        shipping_company = ShippingCompany(packages, engine="island", parameters=GAParameters(max_generations=2))
+        executors = []
+        plan_truck = shipping_company.plan_truck
+        shipping_company.plan_truck = lambda truck: executors.append(shipping_company.island_executor) or plan_truck(truck)
+        shipping_company.load_fleet()
+
+        self.assertEqual(len({id(executor) for executor in executors}), 1)
+        self.assertIsNone(shipping_company.island_executor)
+        self.assertTrue(all(truck.weight <= truck.max_weight for truck in shipping_company.fleet))
+
+class TestFleetAssignment(unittest.TestCase):
+    def setUp(self):
+        self.weights = np.array([4.0, 3.0, 5.0, 2.0, 6.0, 1.0])
+        self.package_fitness = np.array([1.0, 2.0, 0.5, 1.5, 0.2, 0.9])
+        self.capacities = np.array([8.0, 6.0])
 
-        parent1 = Solution(packages, np.fromiter([True, True], bool), 2, 100)
+    def test_1_random_assignments_respect_truck_capacities(self):
+        population = FleetAssignment.generate_random(self.weights, self.package_fitness, self.capacities, 50, np.random.default_rng(0))
 
-        shipping_company = ShippingCompany(packages)
+        self.assertTrue(np.all(population.truck_weights <= self.capacities))
+        self.assertTrue(np.all(population.fitness > 0))
 
-        mutated_child = shipping_company.mutate_solution(parent1, 100)
+    def test_2_repair_unloads_lowest_value_per_kg_and_fills_trucks(self):
+        genomes = np.array([[0, 0, 0, 1, 1, WAREHOUSE], [WAREHOUSE] * 6], dtype=np.int8)
+        population = FleetAssignment(self.weights, self.package_fitness, self.capacities, genomes)
 
-        self.assertTrue(
-            np.array_equal(
-                mutated_child,
-                np.fromiter([False, False], bool)
-            )
-        )
+        self.assertEqual(population.repair(), 1)
 
-    def test_4_calculates_average_fitness(self):
-        mock_solution1 = MagicMock(spec=Solution, fitness = 10)
-        mock_solution2 = MagicMock(spec=Solution, fitness = 10)
-        mock_solution3 = MagicMock(spec=Solution, fitness = 10)
-        generation = [mock_solution2, mock_solution1, mock_solution3]
+        # the 1 kg package fills the first truck's spare kg, an empty fleet is filled truck by truck in value per kg order
+        self.assertListEqual(population.genomes[0].tolist(), [0, 0, WAREHOUSE, 1, WAREHOUSE, 0])
+        self.assertListEqual(population.genomes[1].tolist(), [1, 0, WAREHOUSE, 0, WAREHOUSE, 0])
+        self.assertTrue(np.all(population.truck_weights <= self.capacities))
+        np.testing.assert_array_equal(population.repair_order, calculate_repair_order(self.weights, self.package_fitness))
 
-        shipping_company = ShippingCompany()
+    def test_3_greedy_assignments_fit_and_start_from_greedy_fleet(self):
+        capacities = np.array([8.0, 6.0, 0.0])
+        genomes = generate_greedy_assignments(self.weights, self.package_fitness, capacities, 5, np.random.default_rng(0))
+        population = FleetAssignment(self.weights, self.package_fitness, capacities, genomes)
 
-        average = shipping_company.calculate_average_fitness(generation)
+        self.assertTrue(np.all(population.truck_weights <= capacities))
+        self.assertFalse((genomes == 2).any())
+        first_truck = solve_knapsack_greedy(self.weights, self.package_fitness, 8.0)
+        self.assertListEqual(np.flatnonzero(genomes[0] == 0).tolist(), first_truck.tolist())
+        self.assertTrue(np.all(np.isfinite(population.fitness)))
 
-        self.assertEqual(average, 10)
+    def test_4_children_are_left_unrepaired_without_repair_children(self):
+        genomes = np.array([[0, 0, 0, 1, 1, WAREHOUSE]] * 4, dtype=np.int8)
+        population = FleetAssignment(self.weights, self.package_fitness, self.capacities, genomes, parameters=GAParameters(population_size=4, elitism_participants=0,
+                                                                                                                           repair_children=False, crossover_rate=0))
+
+        next_generation = population.generate_next_generation(0, np.random.default_rng(0))
+
+        self.assertEqual(next_generation.amt_repaired, 0)
+        np.testing.assert_array_equal(next_generation.genomes, genomes)
+
+    def test_5_row_with_an_overloaded_truck_scores_0(self):
+        genomes = np.array([[0, WAREHOUSE, 1, WAREHOUSE], [0, 0, 1, 1]], dtype=np.int8)
+        population = FleetAssignment(np.array([500.0, 500.0, 400.0, 400.0]), np.array([1.0, 1.0, 5.0, 5.0]), np.array([800.0, 800.0]), genomes)
+
+        self.assertListEqual(population.fitness.tolist(), [9.375, 0.0])
+        self.assertEqual(population.best_index(), 0)
 
+    def test_6_overloaded_best_row_is_repaired_before_loading(self):
+        packages = [Package(id, 300.0, id % 9 + 1, 1) for id in range(30)]
+        parameters = GAParameters(population_size=4, elitism_participants=1, repair_children=False, crossover_rate=0, mutation_rate=0, max_generations=2)
+        shipping_company = ShippingCompany(packages, engine="fleet", parameters=parameters)
+        shipping_company.generate_initial_assignments = lambda capacities, population_key=None: np.zeros((4, 30), dtype=np.int8) # everything in truck 0
+
+        shipping_company.load_fleet()
+
+        self.assertTrue(all(truck.weight <= truck.max_weight for truck in shipping_company.fleet))
+        self.assertListEqual([len(truck.packages) for truck in shipping_company.fleet], [2] * 10)
+        self.assertEqual(shipping_company.amt_packages, 10)
+
+class TestKnapsack(unittest.TestCase):
+    def setUp(self):
+        self.weights = np.array([2.3, 4.1, 0.7, 3.3, 1.9, 5.0, 2.6])
+        self.values = np.array([3.0, 5.5, 0.9, 3.8, 2.9, 6.1, 2.2])
+        self.capacity = 9.0
+
+    def best_value_brute_force(self):
+        best_value = 0
+        for amt in range(len(self.weights) + 1):
+            for combination in combinations(range(len(self.weights)), amt):
+                if self.weights[list(combination)].sum() <= self.capacity:
+                    best_value = max(best_value, self.values[list(combination)].sum())
+        return best_value
+
+    def test_1_dp_finds_optimal_load(self):
+        selected = solve_knapsack_dp(self.weights, self.values, self.capacity)
+
+        self.assertLessEqual(self.weights[selected].sum(), self.capacity)
+        self.assertAlmostEqual(self.values[selected].sum(), self.best_value_brute_force())
+
+    def test_2_greedy_load_fits(self):
+        selected = solve_knapsack_greedy(self.weights, self.values, self.capacity)
+
+        self.assertLessEqual(self.weights[selected].sum(), self.capacity)
+        self.assertLessEqual(self.values[selected].sum(), self.best_value_brute_force())
+
+    def test_3_greedy_seed_loads_fit_and_start_from_greedy_answer(self):
+        genomes = generate_greedy_loads(self.weights, self.values, 5, self.capacity, np.random.default_rng(0))
+
+        self.assertListEqual(np.flatnonzero(genomes[0]).tolist(), solve_knapsack_greedy(self.weights, self.values, self.capacity).tolist())
+        self.assertTrue(np.all(genomes.astype(float) @ self.weights <= self.capacity))
+
+class TestStreaming(unittest.TestCase):
+    def test_1_follows_appended_rows(self):
+        filepath = "test_stream_lagerstatus.csv"
+        with open(filepath, "w", encoding='utf-8') as file:
+            file.write("Paket_id,Vikt,Förtjänst,Deadline\n1,2.5,3,4\n2,1.0,9,-1\n3,4")
+        self.addCleanup(os.remove, filepath)
+
+        batches = FileHandler().stream_package_columns(filepath, batch_size=1, follow=True, poll_interval=0.01, idle_timeout=0.2)
+        self.assertEqual(next(batches).ids.tolist(), [1])
+        self.assertEqual(next(batches).ids.tolist(), [2])
+        with open(filepath, "a", encoding='utf-8') as file:
+            file.write(".0,5,0\n4,1.5,2,-3\n")
+        rest = list(batches)
+
+        self.assertEqual([batch.ids.tolist() for batch in rest], [[3], [4]])
+        self.assertEqual(rest[0].weights.tolist(), [4.0])
+
+class TestBenchmark(unittest.TestCase):
+    def test_1_synthetic_inventory_matches_schema(self):
+        with tempfile.TemporaryDirectory() as dirpath:
+            filepath = os.path.join(dirpath, "lagerstatus.csv")
+            generate_synthetic_inventory(filepath, 1000, seed=1)
+            packages = FileHandler().create_package_columns_from_file(filepath, use_cache=False)
+
+        self.assertEqual(len(packages), 1000)
+        self.assertEqual(len(np.unique(packages.ids)), 1000)
+        self.assertTrue(np.all((packages.weights >= 0.1) & (packages.weights <= 12)))
+        self.assertTrue(np.all((packages.price_categories >= 1) & (packages.price_categories <= 9)))
+        self.assertTrue(np.all((packages.deadlines >= -5) & (packages.deadlines <= 9)))
+
+
+class TestDispatchService(unittest.TestCase):
+    def test_1_answers_queries_while_planning(self):
+        packages = PackageColumns.from_packages(sample_packages())
+
+        async def scenario():
+            service = DispatchService(packages, engine="greedy")
+            server = await service.serve()
+            reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+            try:
+                requests = [{"id": 1, "command": "plan"}, {"id": 2, "command": "stats"}, {"id": 3, "command": "add", "packages": [{"id": 100, "weight": 1.5, "price_category": 9, "deadline": -1}]},
+                            {"id": 4, "command": "remove", "ids": [0, 1]}, {"id": 5, "command": "jump"}, []]
+                writer.write("".join(json.dumps(request) + "\n" for request in requests).encode("utf-8"))
+                await writer.drain()
+                responses = {}
+                for _ in requests:
+                    response = json.loads(await reader.readline())
+                    responses[response["id"]] = response
+                for request in ({"id": 6, "command": "stats"}, {"id": 7, "command": "plan"}, {"id": 8, "command": "stats"}):
+                    writer.write((json.dumps(request) + "\n").encode("utf-8"))
+                    await writer.drain()
+                    responses[request["id"]] = json.loads(await reader.readline())
+                return responses, responses[6]
+            finally:
+                writer.close()
+                server.close()
+                service.close()
+
+        responses, stats = asyncio.run(scenario())
+
+        self.assertTrue(responses[2]["result"]["planning"])
+        self.assertEqual(responses[3]["result"]["added"], 1)
+        self.assertFalse(responses[5]["ok"])
+        plan = responses[1]["result"]
+        self.assertEqual(len(plan["trucks"]), 10)
+        self.assertEqual(stats["result"]["packages"], 61 - 2 - plan["packages_loaded"])
+        self.assertEqual(plan["packages_loaded"] + plan["loaded_ids_missing"], sum(truck["packages"] for truck in plan["trucks"]))
+        self.assertFalse(responses[None]["ok"]) # not a JSON object, still answered
+        # the second plan ran on the worker's own inventory updated with the changes made during the first one
+        self.assertEqual(responses[7]["result"]["packages_remaining"], responses[8]["result"]["packages"])
+        self.assertEqual(responses[7]["result"]["loaded_ids_missing"], 0)
+
+class TestTuning(unittest.TestCase):
+    def test_1_successive_halving_keeps_best_profile(self):
+        packages = PackageColumns.from_packages(sample_packages())
+        configurations = sample_configurations(4, np.random.default_rng(0), GAParameters(max_generations=5))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = tune(packages, configurations, amt_seeds=1, workers=2)
+
+        self.assertEqual([tuning_round["configurations"] for tuning_round in report["rounds"]], [4, 2, 1])
+        self.assertEqual([tuning_round["seeds"] for tuning_round in report["rounds"]], [1, 2, 4])
+        self.assertEqual(report["trials"], 4 + 2 + 2)
+        self.assertEqual(report["best"]["seeds"], 4)
+        self.assertIn(GAParameters.from_dict(report["best_profile"]), configurations)
+        first_round = {summary["configuration"]: summary["score"] for summary in report["rounds"][0]["ranking"]}
+        self.assertEqual({summary["configuration"] for summary in report["rounds"][1]["ranking"]}, set(sorted(first_round, key=first_round.get)[2:]))
+
+class TestMain(unittest.TestCase):
+    def test_1_headless_run_writes_results_and_background_plots(self):
+        with tempfile.TemporaryDirectory() as dirpath:
+            inventory_filepath = os.path.join(dirpath, "lagerstatus.csv")
+            output_dirpath = os.path.join(dirpath, "output")
+            generate_synthetic_inventory(inventory_filepath, 3000, seed=2)
+
+            stdout, stderr = io.StringIO(), io.StringIO()
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                exit_code = main_module.main(["--inventory", inventory_filepath, "--engine", "greedy", "--days", "2", "--output-dir", output_dirpath,
+                                              "--background-plots", "--json"])
+
+            self.assertEqual(exit_code, 0)
+            with open(os.path.join(output_dirpath, "results.json"), encoding='utf-8') as results_file:
+                results = json.load(results_file)
+            self.assertDictEqual(json.loads(stdout.getvalue()), results)
+            self.assertEqual([day_report["day"] for day_report in results["days"]], [0, 1])
+            self.assertEqual(results["packages_remaining"] + sum(day_report["packages_loaded"] for day_report in results["days"]), 3000)
+            self.assertEqual(len(results["plots"]), 2 * 10 * 2 + 2)
+            self.assertEqual(set(results["histograms"]), {os.path.basename(filepath).removesuffix(".png") for filepath in results["plots"]})
+            for filepath in results["plots"]:
+                self.assertTrue(os.path.getsize(filepath) > 0)
 
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
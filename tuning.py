@@ -0,0 +1,175 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import shipping_company as shipping_company_module
+from benchmark import synthetic_inventory_filepath
+from filehandler import FileHandler
+from package import PackageColumns
+from parameters import GAParameters
+from shipping_company import ShippingCompany, Solution
+
+# candidate values per GA parameter, the Constants defaults are among them
+SEARCH_SPACE = {
+    "population_size": (50, 100, 200),
+    "generations": (5, 10, 20),
+    "amt_tournament_participants": (2, 4, 8),
+    "crossover_rate": (0.6, 0.8, 0.95),
+    "crossover_operator": ("single_point", "two_point", "uniform"),
+    "mutation_rate": (0.0005, 0.001, 0.005),
+    "max_mutation_rate": (0.05, 0.1, 0.2),
+    "fitness_delta_threshold": (0.01, 0.1, 0.5),
+    "elitism_participants": (1, 5, 10),
+    "greedy_seed_ratio": (0.0, 0.1, 0.3),
+    "weight_weight": (1, 3),
+}
+OBJECTIVES = ("fitness_per_second", "fitness")
+
+_packages = None # inventory of the worker process, set once by its initializer
+
+def sample_configurations(amt_configurations: int, rng: np.random.Generator, base: GAParameters = None) -> list[GAParameters]:
+    # the base profile comes first, the rest are distinct random points of the search space
+    base = base if base is not None else GAParameters()
+    configurations = [base]
+    seen = {tuple(sorted(base.to_dict().items()))}
+    for _ in range(100 * amt_configurations):
+        if len(configurations) >= amt_configurations:
+            break
+        changes = {name: values[rng.integers(len(values))] for name, values in SEARCH_SPACE.items()}
+        try:
+            configuration = base.replace(**changes)
+        except ValueError:
+            continue
+        key = tuple(sorted(configuration.to_dict().items()))
+        if key not in seen:
+            seen.add(key)
+            configurations.append(configuration)
+    return configurations
+
+def initialize_worker(packages: PackageColumns):
+    global _packages
+    _packages = packages
+
+def run_trial(parameters: dict, engine: str, seed: int, time_budget: float | None) -> dict:
+    # Plans one truck with the given profile. The load is scored with the default fitness weights as well, so profiles
+    # that change the weights are still compared on the same scale.
+    shipping_company_module.random_generator = np.random.default_rng(seed)
+    shipping_company = ShippingCompany(_packages.take(np.arange(len(_packages))), engine=engine, time_budget=time_budget,
+                                       parameters=GAParameters.from_dict(parameters))
+    start = time.perf_counter()
+    shipping_company.planning_deadline = shipping_company.slice_deadline(start, 1)
+    best_solution = shipping_company.genetic_algorithm()
+    seconds = time.perf_counter() - start
+
+    fitness = Solution(shipping_company.packages, shipping_company.max_deadline, shipping_company.min_deadline, include_indices=best_solution.include_indices).fitness
+    return {
+        "seed": seed,
+        "seconds": seconds,
+        "fitness": fitness,
+        "fitness_per_second": fitness / seconds,
+        **shipping_company.last_run,
+    }
+
+def summarize(configuration: GAParameters, trials: list[dict], objective: str) -> dict:
+    defaults = GAParameters().to_dict()
+    return {
+        "parameters": {name: value for name, value in configuration.to_dict().items() if value != defaults[name]},
+        "score": float(np.mean([trial[objective] for trial in trials])),
+        "fitness": float(np.mean([trial["fitness"] for trial in trials])),
+        "seconds": float(np.mean([trial["seconds"] for trial in trials])),
+        "fitness_per_second": float(np.mean([trial["fitness_per_second"] for trial in trials])),
+        "generations": float(np.mean([trial["generations"] for trial in trials])),
+        "seeds": len(trials),
+    }
+
+def successive_halving(configurations: list[GAParameters], executor: ProcessPoolExecutor, engine: str = "matrix", amt_seeds: int = 1, eta: int = 2,
+                       objective: str = "fitness_per_second", time_budget: float = None, seed: int = 0) -> list[dict]:
+    # Every round runs the surviving configurations on eta times as many seeds as the round before, keeps the best
+    # 1/eta of them and reuses the trials of earlier rounds, until one configuration is left.
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective {objective}, expected one of {OBJECTIVES}")
+    if eta < 2:
+        raise ValueError(f"eta must be at least 2, got {eta}")
+
+    trials = {index: [] for index in range(len(configurations))}
+    survivors = list(range(len(configurations)))
+    rounds = []
+    while True:
+        futures = {}
+        for index in survivors:
+            for trial_seed in range(seed + len(trials[index]), seed + amt_seeds):
+                futures[executor.submit(run_trial, configurations[index].to_dict(), engine, trial_seed, time_budget)] = index
+        for future, index in futures.items():
+            trials[index].append(future.result())
+
+        ranking = sorted((summarize(configurations[index], trials[index], objective) | {"configuration": index} for index in survivors),
+                         key=lambda summary: summary["score"], reverse=True)
+        rounds.append({"configurations": len(survivors), "seeds": amt_seeds, "trials": len(futures), "ranking": ranking})
+        print(f"round {len(rounds)}: {len(survivors)} configurations on {amt_seeds} seeds, best {objective} {ranking[0]['score']:.3f}")
+        if len(survivors) == 1:
+            return rounds
+        survivors = [summary["configuration"] for summary in ranking[:max(1, len(survivors) // eta)]]
+        amt_seeds *= eta
+
+def tune(packages: PackageColumns, configurations: list[GAParameters], engine: str = "matrix", amt_seeds: int = 1, eta: int = 2,
+         objective: str = "fitness_per_second", time_budget: float = None, workers: int = None, seed: int = 0) -> dict:
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=initialize_worker, initargs=(packages,)) as executor:
+        rounds = successive_halving(configurations, executor, engine, amt_seeds, eta, objective, time_budget, seed)
+    best = rounds[-1]["ranking"][0]
+    return {
+        "engine": engine,
+        "objective": objective,
+        "packages": len(packages),
+        "time_budget": time_budget,
+        "configurations": len(configurations),
+        "trials": sum(tuning_round["trials"] for tuning_round in rounds),
+        "seconds": time.perf_counter() - start,
+        "best": best,
+        "best_profile": configurations[best["configuration"]].to_dict(),
+        "rounds": rounds,
+    }
+
+def parse_args(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Search GA parameter profiles with successive halving over seeded trials in a process pool "
+                                                 "and report the profile with the best fitness per second.")
+    parser.add_argument("--inventory", default=None, help="inventory csv, defaults to Constants.LAGERSTATUS_FILEPATH")
+    parser.add_argument("--synthetic", type=int, default=None, help="tune on a synthetic inventory of this many packages instead")
+    parser.add_argument("--engine", default="matrix", choices=("solution", "matrix"))
+    parser.add_argument("--configurations", type=int, default=16, help="profiles in the first round, the defaults included")
+    parser.add_argument("--seeds", type=int, default=1, help="seeded trials per profile in the first round")
+    parser.add_argument("--eta", type=int, default=2, help="every round keeps 1/eta of the profiles and runs eta times as many seeds")
+    parser.add_argument("--objective", default="fitness_per_second", choices=OBJECTIVES)
+    parser.add_argument("--time-budget", type=float, default=None, help="seconds per trial, a trial returns its best load so far when it runs out")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to the cpu count")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the sampled profiles and the first trial")
+    parser.add_argument("--profile", default=None, help="base profile json the search starts from, defaults to the Constants")
+    parser.add_argument("--output", default=None, help="write the report as JSON to this file")
+    parser.add_argument("--save-profile", default=None, help="write the best profile as JSON to this file, for main.py --profile")
+    return parser.parse_args(argv)
+
+def main(argv: list[str] = None):
+    args = parse_args(argv)
+    filepath = synthetic_inventory_filepath(args.synthetic, args.seed) if args.synthetic is not None else args.inventory
+    packages = FileHandler().create_package_columns_from_file(filepath)
+    base = GAParameters.load(args.profile) if args.profile else GAParameters()
+    configurations = sample_configurations(args.configurations, np.random.default_rng(args.seed), base)
+
+    report = tune(packages, configurations, args.engine, args.seeds, args.eta, args.objective, args.time_budget, args.workers, args.seed)
+    best = report["best"]
+    print(f"Best of {report['configurations']} profiles after {report['trials']} trials in {report['seconds']:.1f} s: "
+          f"{best['fitness_per_second']:.1f} fitness/s, fitness {best['fitness']:.2f} in {best['seconds']:.3f} s, changes {best['parameters']}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding='utf-8') as output_file:
+            json.dump(report, output_file, indent=2)
+    if args.save_profile:
+        GAParameters.from_dict(report["best_profile"]).save(args.save_profile)
+
+if __name__ == "__main__":
+    main()